@@ -0,0 +1,163 @@
+"""Headless batch processing of many scenes at once, without the GUI (tkinter is never imported).
+Each scene in an input directory is solved in parallel across a pool of processes, using the `processing` engines.
+Scenes can be given as:
+- <name>.npz archives holding "maskarray" and "potentialarray" arrays (as saved by export.py),
+- <name>/ directories holding maskarray and potentialarray as .npy or .txt files,
+- <name>.json scene descriptions of the shapes drawn (as saved by the GUI, see scene.py), rasterized on loading.
+Masks use the solver convention - 1 (True) for editable background points, 0 for fixed boundaries.
+
+The solution of each scene is saved to <output>/<name>/, and a per-scene timing summary to <output>/summary.csv.
+Run from the command line, e.g.
+    python batch.py scenes/ --output results/ --engine multigrid --boundary periodic --workers 8
+"""
+import argparse
+import csv
+import inspect
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numba
+import numpy as np
+
+import processing
+from export import export_arrays, solution_arrays
+from scene import Scene
+
+
+def find_scenes(directory):
+    #list of (name, path) for every scene found in the directory, in name order
+    scenes = []
+    for entry in sorted(os.listdir(directory)):
+        path = os.path.join(directory, entry)
+        if entry.endswith(".npz"):
+            scenes.append((entry[:-4], path))
+        elif entry.endswith(".json"):
+            scenes.append((entry[:-5], path))
+        elif os.path.isdir(path) and _array_file(path, "maskarray") is not None:
+            scenes.append((entry, path))
+    return scenes
+
+
+def load_scene(path):
+    #read the mask and potential arrays of one scene - masks in the solver convention (True for editable points)
+    if path.endswith(".json"):
+        boundaries, potentialarray = Scene.load(path).rasterize()
+        return ~boundaries, potentialarray
+
+    if path.endswith(".npz"):
+        with np.load(path) as arrays:
+            return arrays["maskarray"], arrays["potentialarray"]
+
+    arrays = []
+    for key in ("maskarray", "potentialarray"):
+        filename = _array_file(path, key)
+        if filename is None:
+            raise FileNotFoundError("No {0}.npy or {0}.txt in {1}".format(key, path))
+        arrays.append(np.load(filename) if filename.endswith(".npy") else np.loadtxt(filename))
+    return tuple(arrays)
+
+
+def _array_file(directory, key):
+    #path of a saved array in a scene directory, preferring the binary format - None if neither exists
+    for extension in (".npy", ".txt"):
+        filename = os.path.join(directory, key + extension)
+        if os.path.exists(filename):
+            return filename
+    return None
+
+
+def solve_scene(name, path, output_dir, engine="sor", boundary="periodic", rtol=1e-4, formats=("npz",), threads=1):
+    #load, solve and save a single scene, timing each stage - run in a worker process
+    #any failure is recorded in the summary rather than stopping the rest of the batch
+    summary = {"scene":name, "engine":engine, "boundary":boundary, "status":"ok"}
+    start = time.perf_counter()
+    try:
+        numba.set_num_threads(min(threads, numba.config.NUMBA_NUM_THREADS))
+        options = {"f":"auto", "chebyshev":True} if engine == "sor" else {}
+        #engines able to report diagnostics also give their iteration count and final residual for the summary
+        diagnostics = "diagnostics" in inspect.signature(processing.ENGINES[engine]).parameters
+        if diagnostics:
+            options["diagnostics"] = True
+
+        maskarray, potentialarray = load_scene(path)
+        summary["height"], summary["width"] = maskarray.shape
+        summary["load_time"] = time.perf_counter() - start
+
+        t = time.perf_counter()
+        final_potentials = processing.solve(maskarray, potentialarray, engine, rtol, boundary, **options)
+        summary["solve_time"] = time.perf_counter() - t
+        if diagnostics:
+            final_potentials, info = final_potentials
+            summary["iterations"], summary["residual"] = info.iterations, info.residuals[-1][1]
+
+        t = time.perf_counter()
+        Efield = processing.get_Efield(final_potentials, boundary=boundary)
+        summary["field_time"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        export_arrays(solution_arrays(maskarray, potentialarray, final_potentials, Efield), os.path.join(output_dir, name), formats)
+        summary["save_time"] = time.perf_counter() - t
+
+    except Exception as error:
+        summary["status"] = "failed: {0}".format(error)
+
+    summary["total_time"] = time.perf_counter() - start
+    return summary
+
+
+def run_batch(input_dir, output_dir, engine="sor", boundary="periodic", rtol=1e-4, workers=None, formats=("npz",), threads=1):
+    #solve every scene in input_dir across a pool of worker processes, saving results and summary.csv to output_dir
+    #each worker uses "threads" threads for the parallel solver kernels (1 avoids oversubscribing the cores)
+    #returns the list of per-scene summaries, in scene order
+    scenes = find_scenes(input_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    summaries = {}
+    #workers are started fresh rather than forked, so callers that have already solved in this process (starting
+    #numba's OpenMP threads, which can't survive a fork) can still run a batch
+    with ProcessPoolExecutor(workers, multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(solve_scene, name, path, output_dir, engine, boundary, rtol, formats, threads): name
+                   for name, path in scenes}
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries[futures[future]] = summary
+            print("{scene}: {status} ({total_time:.2f} s)".format(**summary), flush=True)
+
+    summaries = [summaries[name] for name, path in scenes]
+    write_summary(summaries, os.path.join(output_dir, "summary.csv"))
+    return summaries
+
+
+def write_summary(summaries, filename):
+    #per-scene timings as a CSV table, one row per scene
+    columns = ["scene", "engine", "boundary", "height", "width", "status", "iterations", "residual",
+               "load_time", "solve_time", "field_time", "save_time", "total_time"]
+    with open(filename, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(summaries)
+    return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve a directory of scenes for their potentials and electric fields.")
+    parser.add_argument("input", help="directory of scenes (.npz archives, .json scene files, or directories of mask/potential arrays)")
+    parser.add_argument("-o", "--output", default="results", help="directory for the solutions and summary.csv")
+    parser.add_argument("-e", "--engine", default="sor", choices=sorted(processing.ENGINES), help="solver engine")
+    parser.add_argument("-b", "--boundary", default="periodic", choices=["fixed", "periodic"], help="edge boundary conditions")
+    parser.add_argument("--rtol", type=float, default=1e-4, help="solver tolerance")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes (default: one per core)")
+    parser.add_argument("-t", "--threads", type=int, default=1, help="solver threads within each worker")
+    parser.add_argument("-f", "--formats", nargs="+", default=["npz"], choices=["npz", "npy", "txt"], help="output formats")
+    args = parser.parse_args(argv)
+
+    summaries = run_batch(args.input, args.output, args.engine, args.boundary, args.rtol, args.workers, args.formats, args.threads)
+    failed = sum(summary["status"] != "ok" for summary in summaries)
+    print("Solved {0} of {1} scenes.".format(len(summaries) - failed, len(summaries)))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,196 @@
+"""Benchmarks of the solver engines in `processing`, to tell whether a change made them faster or slower.
+Standard scenes are generated at several grid sizes - the parallel plates and cylinder from the README screenshots,
+and a field of randomly placed conductors - and every engine is run on each, with "fixed" and "periodic" boundaries
+and at each number of solver threads.
+
+For every run the wall time (best of the repeats), iteration count, peak memory and final residual are recorded.
+Each engine is run once on a small grid first, so numba compilation is not included in the times.
+Peak memory is measured in a separate run with tracemalloc (NumPy arrays and Python objects - memory allocated
+inside compiled libraries, such as the SuperLU factors of sparse_direct, is not seen).
+
+Results are written as JSON, and two results files can be compared, e.g.
+    python benchmark.py --sizes 300x250 600x500 --output before.json
+    python benchmark.py --sizes 300x250 600x500 --output after.json
+    python benchmark.py --compare before.json after.json
+"""
+import argparse
+import inspect
+import json
+import platform
+import time
+import tracemalloc
+
+import numba
+import numpy as np
+
+import processing
+from scene import Scene
+
+
+#options each engine is run with, as used by the GUI
+ENGINE_OPTIONS = {"sor":{"f":"auto", "chebyshev":True}}
+
+#engines run unless others are asked for - plain Jacobi iteration takes minutes on the larger grids
+DEFAULT_ENGINES = ["multigrid", "sor", "sparse_direct", "spectral"]
+
+
+def plates_scene(width=600, height=500):
+    #two plates at +10 V and -10 V with a cylinder at 5 V between them, scaled to the grid size
+    scene = Scene(width, height)
+    sx, sy = width / 600, height / 500
+    scene.add_shape("Rectangle", (300*sx, 105*sy), 400*sx, 10*sy, potential=10)
+    scene.add_shape("Rectangle", (300*sx, 395*sy), 400*sx, 10*sy, potential=-10)
+    scene.add_shape("Oval", (300*sx, 250*sy), 80*sx, 80*sy, potential=5)
+    return scene
+
+
+def random_scene(width=600, height=500, count=30, seed=0):
+    #randomly placed and rotated conductors at random potentials between -10 V and +10 V
+    rng = np.random.default_rng(seed)
+    scene = Scene(width, height)
+    for i in range(count):
+        scene.add_shape(rng.choice(["Rectangle", "Oval", "Triangle"]), (rng.uniform(0, width), rng.uniform(0, height)),
+                        rng.uniform(0.02, 0.15) * width, rng.uniform(0.02, 0.15) * height,
+                        rng.uniform(0, 360), rng.uniform(-10, 10))
+    return scene
+
+
+SCENES = {"plates":plates_scene, "random":random_scene}
+
+
+def scene_arrays(name, width, height):
+    #solver inputs for a standard scene - mask True for editable points
+    boundaries, potentialarray = SCENES[name](width, height).rasterize()
+    return ~boundaries, potentialarray
+
+
+def run_case(engine, maskarray, potentialarray, boundary="fixed", rtol=1e-4, repeats=3, memory=True):
+    #time one engine on one scene, returning a dictionary of the measurements
+    #the best of the repeats is taken as the wall time, and the iteration count and residual come from the last
+    options = dict(ENGINE_OPTIONS.get(engine, {}))
+    iterations = []
+    if "callback" in inspect.signature(processing.ENGINES[engine]).parameters:
+        options["callback"] = lambda iteration, change: iterations.append(iteration)
+
+    times = []
+    for repeat in range(repeats):
+        processing._factorizations.clear()  # - time sparse_direct's factorization too, not just the cached re-solve
+        iterations.clear()
+        start = time.perf_counter()
+        v = processing.solve(maskarray, potentialarray, engine, rtol, boundary, **options)
+        times.append(time.perf_counter() - start)
+
+    result = {"time":min(times), "times":times, "iterations":iterations[-1] if iterations else None,
+              "residual_inf":processing.residual(maskarray, v, boundary, "inf"),
+              "residual_rms":processing.residual(maskarray, v, boundary, "2")}
+
+    if memory:
+        processing._factorizations.clear()
+        tracemalloc.start()
+        processing.solve(maskarray, potentialarray, engine, rtol, boundary, **options)
+        result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def run_benchmarks(scenes=("plates", "random"), sizes=((300, 250), (600, 500)), engines=None, boundaries=("fixed", "periodic"),
+                   threads=None, rtol=1e-4, repeats=3, memory=True):
+    #run every combination of scene, size, engine, boundary type and thread count
+    #returns the list of results, each a dictionary of the case and its measurements
+    engines = DEFAULT_ENGINES if engines is None else engines
+    threads = sorted({1, numba.config.NUMBA_NUM_THREADS}) if threads is None else threads
+
+    #compile everything before timing, on a small version of each boundary type
+    small_mask, small_potentials = scene_arrays("plates", 48, 40)
+    for engine in engines:
+        for boundary in boundaries:
+            processing.solve(small_mask, small_potentials, engine, rtol, boundary, **ENGINE_OPTIONS.get(engine, {}))
+
+    results = []
+    for name in scenes:
+        for width, height in sizes:
+            maskarray, potentialarray = scene_arrays(name, width, height)
+            for engine in engines:
+                for boundary in boundaries:
+                    for count in threads:
+                        numba.set_num_threads(min(count, numba.config.NUMBA_NUM_THREADS))
+                        case = {"scene":name, "width":width, "height":height, "engine":engine,
+                                "boundary":boundary, "threads":count, "rtol":rtol}
+                        case.update(run_case(engine, maskarray, potentialarray, boundary, rtol, repeats, memory))
+                        results.append(case)
+                        print(_describe(case), flush=True)
+
+    numba.set_num_threads(numba.config.NUMBA_NUM_THREADS)
+    return results
+
+
+def _describe(case):
+    #one line summary of a benchmark result
+    memory = "{0:.1f} MB".format(case["peak_memory"] / 2**20) if "peak_memory" in case else "-"
+    return ("{scene:>8} {width:>5}x{height:<5} {engine:>14} {boundary:>8} {threads:>2} threads: {time:8.3f} s, "
+            "{iterations!s:>6} iterations, residual {residual_inf:.2e} V, peak {0}").format(memory, **case)
+
+
+def system_info():
+    #details of the machine and library versions, saved alongside the results
+    return {"python":platform.python_version(), "numpy":np.__version__, "numba":numba.__version__,
+            "machine":platform.machine(), "processor":platform.processor(), "platform":platform.platform(),
+            "threads_available":numba.config.NUMBA_NUM_THREADS, "date":time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def save_results(results, filename):
+    with open(filename, "w") as file:
+        json.dump({"system":system_info(), "results":results}, file, indent=1)
+    return
+
+
+def load_results(filename):
+    with open(filename) as file:
+        return json.load(file)["results"]
+
+
+def compare(old_results, new_results):
+    #print the change in wall time of every case found in both sets of results
+    #returns a dictionary of case -> speed-up (old time / new time)
+    def key(case):
+        return tuple(case[field] for field in ("scene", "width", "height", "engine", "boundary", "threads"))
+
+    old = {key(case): case for case in old_results}
+    speedups = {}
+    for case in new_results:
+        if key(case) in old:
+            before, after = old[key(case)]["time"], case["time"]
+            speedups[key(case)] = before / after
+            print("{0:>8} {1:>5}x{2:<5} {3:>14} {4:>8} {5:>2} threads: {6:8.3f} s -> {7:8.3f} s  ({8:.2f}x)".format(
+                  *key(case), before, after, before / after))
+    return speedups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the solver engines on standard scenes.")
+    parser.add_argument("--scenes", nargs="+", default=["plates", "random"], choices=sorted(SCENES))
+    parser.add_argument("--sizes", nargs="+", default=["150x125", "300x250", "600x500"], help="grid sizes as WIDTHxHEIGHT")
+    parser.add_argument("--engines", nargs="+", default=None, choices=sorted(processing.ENGINES), help="default: all but jacobi")
+    parser.add_argument("--boundaries", nargs="+", default=["fixed", "periodic"], choices=["fixed", "periodic"])
+    parser.add_argument("--threads", nargs="+", type=int, default=None, help="solver thread counts (default: 1 and all)")
+    parser.add_argument("--rtol", type=float, default=1e-4, help="solver tolerance")
+    parser.add_argument("--repeats", type=int, default=3, help="runs of each case, the fastest is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the (slower) peak memory measurement")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="file to write the results to")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(load_results(args.compare[0]), load_results(args.compare[1]))
+        return 0
+
+    sizes = [tuple(int(n) for n in size.lower().split("x")) for size in args.sizes]
+    results = run_benchmarks(args.scenes, sizes, args.engines, args.boundaries, args.threads,
+                             args.rtol, args.repeats, not args.no_memory)
+    save_results(results, args.output)
+    print("Results saved to {0}".format(args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,62 @@
+"""Saving input and solved arrays to disk, for use outside the GUI.
+Arrays are written in NumPy's binary formats by default, which are exact and quick to read and write:
+- "npz": a single archive holding every array,
+- "npy": one file per array, which can be opened memory-mapped (see load_arrays) without reading it all,
+- "txt": plain text via np.savetxt, as originally output by the GUI (slow and lossy, kept for compatibility).
+"""
+import os
+
+import numpy as np
+
+
+def export_arrays(arrays, directory=".", formats=("npz",), name="solution"):
+    #save a dictionary of named arrays in each of the requested formats
+    #"npz" is saved as <name>.npz, the others as one <array name>.npy/.txt file per array
+    #returns the paths of the files written
+    os.makedirs(directory, exist_ok=True)
+    written = []
+
+    for fmt in formats:
+        if fmt == "npz":
+            path = os.path.join(directory, name + ".npz")
+            np.savez(path, **arrays)
+            written.append(path)
+
+        elif fmt == "npy":
+            for key, arr in arrays.items():
+                path = os.path.join(directory, key + ".npy")
+                np.save(path, arr)
+                written.append(path)
+
+        elif fmt == "txt":
+            for key, arr in arrays.items():
+                path = os.path.join(directory, key + ".txt")
+                np.savetxt(path, arr, delimiter=" ", fmt="%f")
+                written.append(path)
+
+        else:
+            raise ValueError("Unknown export format '{0}' - expected 'npz', 'npy' or 'txt'.".format(fmt))
+
+    return written
+
+
+def load_arrays(directory=".", names=None, mmap=True):
+    #open arrays saved by export_arrays in the "npy" format, as a dictionary of name -> array
+    #with mmap=True the arrays are memory-mapped read-only, so only the parts accessed are read from disk
+    #names selects particular arrays, otherwise every .npy file in the directory is opened
+    if names is None:
+        names = sorted(filename[:-4] for filename in os.listdir(directory) if filename.endswith(".npy"))
+
+    mode = "r" if mmap else None
+    return {key: np.load(os.path.join(directory, key + ".npy"), mmap_mode=mode) for key in names}
+
+
+def solution_arrays(maskarray, potentialarray, final_potentials=None, Efield=None):
+    #collect the standard set of arrays from a solve under their saved names
+    #the mask uses the solver convention - 1 (True) for editable background points, 0 for fixed boundaries
+    arrays = {"maskarray": maskarray, "potentialarray": potentialarray}
+    if final_potentials is not None:
+        arrays["final_potentials"] = final_potentials
+    if Efield is not None:
+        arrays["Efield_x"], arrays["Efield_y"] = Efield
+    return arrays
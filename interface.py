@@ -1,28 +1,22 @@
 """Testing modules and importing. Define arbitrary class to see if local import works.
 """
 
+import queue
+import threading
+
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
-from matplotlib.colors import LogNorm, Normalize
-from matplotlib.path import Path  # - for testing points within boundaries
 from tkinter import *  # - saves having to write extra "tk" every time throughout definition. (e.g. "tk.Button" -> "Button")
 from tkinter import ttk
-import matplotlib.image as mpimg  # - reading image to numpy array
-from PIL import Image  # - take image of canvas
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg  # - embed plots in window
-
-try:
-    #ghostscript has to be installed and available in the system path to save and convert tkinter canvas to image
-    #supply location to the gs bin file
-    import ghostscript
-    from PIL import EpsImagePlugin
-    EpsImagePlugin.gs_windows_binary = r"C:\Program Files\gs\gs9.55.0\bin\gswin64c.exe"
-finally:
-    pass
+from tkinter import filedialog
 
+#matplotlib is only needed once the canvas is processed, and is slow to import,
+#so it is imported in the methods using it - the window then opens without waiting for it
 
-from processing import sor, get_Efield
+from processing import sor, multigrid, sparse_direct, spectral, field_arrays, coarsen, refine, warm_up as processing_warm_up
+from shapes import rasterize_shape, rasterize_polygon, outline_coords, outline_template
+from scene import Scene
+from export import export_arrays, solution_arrays
+from rendering import draw_field, prepare_field
 
 
 class GUI():
@@ -36,7 +30,7 @@ class GUI():
     all accessible within the same location for ease-of-use.
     """
     
-    def __init__(self,window, canvas_width=500, canvas_height=500):
+    def __init__(self,window, canvas_width=500, canvas_height=500, warm_up=True):
         self.canvas_width, self.canvas_height = canvas_width, canvas_height
         
         self.window = window
@@ -87,6 +81,15 @@ class GUI():
         self.clearbutton["borderwidth"] = 0.5
         self.clearbutton["relief"] = "ridge"
         
+        #buttons to save the shapes drawn as a scene file, and to load one back onto the canvas (see scene.py)
+        self.savescenebutton = Button(self.canvas_frame, text="Save Scene", width=12, height=1, bg="whitesmoke", font=("Calibri",11), command=self.save_scene)
+        self.savescenebutton.grid(row=1, column=1, sticky="NWE", padx=(2,5), pady=(5,0), columnspan=3)
+        self.loadscenebutton = Button(self.canvas_frame, text="Load Scene", width=12, height=1, bg="whitesmoke", font=("Calibri",11), command=self.load_scene)
+        self.loadscenebutton.grid(row=2, column=1, sticky="NWE", padx=(2,5), pady=0, columnspan=3)
+        for button in (self.savescenebutton, self.loadscenebutton):
+            button["borderwidth"] = 0.5
+            button["relief"] = "ridge"
+        
         #button to begin processing of input canvas (outputting arrays)
         self.processbutton = Button(self.buttons_frame, text="Process Canvas", width=26, height=4, bg="whitesmoke", font=("Calibri", 11), command=self.output_arrays)
         self.processbutton.grid(row=10, column=0, sticky="SWE", padx=(0,0), pady=10, columnspan=10)
@@ -166,6 +169,18 @@ class GUI():
         self.boundary_toggle.set(1)
         self.bd_cond_box = Checkbutton(self.buttons_frame, variable=self.boundary_toggle, text="Set Boundary")
         self.bd_cond_box.grid(row=3, column=4, sticky="EW", columnspan=6, rowspan=3)
+        
+        #drop-down menu for the solver used to process the canvas
+        #"Sparse Direct" factorizes once per conductor layout, so is fastest for re-solving with new potentials
+        #"Spectral" solves with FFTs, and is quickest on large canvases with few conductors
+        solver_options = ["SOR","Multigrid","Sparse Direct","Spectral"]
+        self.solver_label = Label(self.buttons_frame, text="Solver")
+        self.solver_label.grid(row=7, column=0, sticky="W")
+        self.solver_list = ttk.Combobox(self.buttons_frame, width=25, state="readonly")
+        self.solver_list["values"] = solver_options
+        self.solver_list.current(0)
+        self.solver_list.grid(row=8, column=0, padx=0, sticky="WE", columnspan=6)
+        self.solver_list.bind("<Leave>", self.click_focus)
                 
         
         
@@ -179,7 +194,7 @@ class GUI():
         
         #canvas bindings
         self.maincanvas.bind("<Motion>", lambda event: self.draw_outline(event))
-        self.maincanvas.bind("<Leave>", lambda event: self.maincanvas.delete("outline"))
+        self.maincanvas.bind("<Leave>", lambda event: self.hide_outline())
         self.maincanvas.bind("<Button-1>", lambda event: self.draw_shape(event))
         self.maincanvas.bind("<B1-Motion>", lambda event: self.draw_shape(event))
         
@@ -210,6 +225,13 @@ class GUI():
         
         
         
+        #the hover outline and the mini-canvas preview are single canvas items, made when first drawn and then
+        #moved or reshaped in place (see draw_outline and draw_preview)
+        self.outline_item, self.preview_item = None, None
+        #motion events arrive far faster than the screen refreshes - the outline is redrawn at most once a frame
+        self.outline_interval = 16  # - ms, one frame at 60 Hz
+        self.outline_position, self.outline_drawn, self.outline_job = None, None, None
+        
         #finish any other setup needed
         #toggle axes on by default
         if self.axes_toggle.get() == 1:
@@ -217,16 +239,71 @@ class GUI():
         self.draw_preview()
         
         #potential array setup
-        self.maskarray = np.zeros((self.canvas_width, self.canvas_height)).T
-        self.potentialarray = np.zeros((self.canvas_width, self.canvas_height)).T
+        #the mask is Boolean - True for boundary points, False for the background
+        self.maskarray = np.zeros((self.canvas_height, self.canvas_width), dtype=bool)
+        self.potentialarray = np.zeros((self.canvas_height, self.canvas_width))
+        
+        #record of every shape placed, so the design can be saved, reloaded or rasterized without the canvas
+        self.scene = Scene(self.canvas_width, self.canvas_height)
+        
+        #image of the shapes drawn, rendered on the solver thread and kept until the shapes change (see output_arrays)
+        #scene_version counts the changes to the shapes, and shapes_image is (version, image) for the last one rendered
+        self.scene_version = 0
+        self.shapes_image = None
+        #set once a shape the scene can't record is added (see add_new_potential) - the mask is then drawn instead
+        self.scene_incomplete = False
+        
+        #points changed since the last solve - the rest of the last solution is reused as the next starting guess
+        self.edited_region = np.ones(self.maskarray.shape, dtype=bool)
+        
+        #arrays saved after every solve (see export.py) - set export_formats to [] to save nothing
+        #formats: "npz" (single archive), "npy" (one file per array, can be memory-mapped), "txt" (original text files)
+        self.export_formats = ["npz"]
+        self.export_directory = "."
+        
+        #floating point precision of the SOR solve and the field - np.float32 halves the memory traffic
+        #at the cost of accuracy (see processing.precision_error)
+        self.solve_dtype = np.float64
+        
+        #"Process Canvas" first solves copies of the canvas downsampled by each of these factors in turn (coarsest first),
+        #showing each in the output window as soon as it's ready - set preview_factors to [] to solve the full grid only
+        self.preview_factors = [8, 4, 2]
+        
+        #how the field is drawn in the output window and by plot("field") - "streamlines", "quiver" or "lic" (see rendering.py)
+        self.field_style = "streamlines"
         
         #output
         #invert mask array so that 1 corresponds to background and 0 the boundaries (shapes)
         #then can output to txt files
         
+        #whether a solve is running on the solver thread (see output_arrays)
+        self.solving = False
+        
+        #compile the solver kernels (or load them from numba's cache) in the background while the user draws
+        #so the first "Process Canvas" doesn't wait for them - solves and scene loading join this thread first
+        self.warm_up_thread = threading.Thread(target=self.warm_up, daemon=True)
+        if warm_up:
+            self.warm_up_thread.start()
+        
         return ###### __init__ end ######
     
     
+    def warm_up(self):
+        #runs on the warm-up thread - a tiny solve and rasterization, with nothing shown
+        processing_warm_up(background=False)
+        scene = Scene(8, 8)
+        scene.add_shape("Oval", (4, 4), 4, 4)
+        scene.rasterize()
+        return
+    
+    
+    def wait_for_warm_up(self):
+        #numba's parallel kernels mustn't run on two threads at once
+        if self.warm_up_thread.is_alive():
+            self.warm_up_thread.join()
+        return
+    
+    
     def click_focus(self, event):
         if event.type == EventType.ButtonPress:
             #coordinates location only applies on button click
@@ -266,11 +343,16 @@ class GUI():
         #another way to specify ? - e.g. all tags except "axis" ?
         
         self.maincanvas.delete("all")
+        self.outline_item, self.outline_drawn = None, None  # - deleted along with everything else
         if self.axes_toggle.get() == 1:
             self.draw_axes()
             
-        self.maskarray = np.zeros((self.canvas_width, self.canvas_height)).T
-        self.potentialarray = np.zeros((self.canvas_width, self.canvas_height)).T
+        self.maskarray = np.zeros((self.canvas_height, self.canvas_width), dtype=bool)
+        self.potentialarray = np.zeros((self.canvas_height, self.canvas_width))
+        self.edited_region[:] = True
+        self.scene.clear()
+        self.scene_version += 1
+        self.scene_incomplete = False
         return
     
     
@@ -286,14 +368,14 @@ class GUI():
         height = self.prev_scale * int(self.heightbox.get())
         width = self.prev_scale * int(self.widthbox.get())
         drawcolour = self.get_colour(self.redbox.get(), self.greenbox.get(), self.bluebox.get())
-        draw_opts = {"fill":drawcolour, "width":0, "tags":"preview"}
         
         
-        self.mini_canvas.delete("preview")
         if shape == "Freehand Line":  # - no preview can be drawn for freehand
             #also doesn't work as a boundary
             #grey out the boundary toggle option
             #re-enable when shape changes
+            if self.preview_item is not None:
+                self.mini_canvas.itemconfigure(self.preview_item, state="hidden")
             self.bd_cond_box.config(state = DISABLED)
             return
         
@@ -301,58 +383,36 @@ class GUI():
         self.bd_cond_box.config(state = ACTIVE)
         
         
-        #check the rest
-        #others drawn by coordinate bounding boxes - (x0,y0,x1,y1)
-        #### - NOTE: actually can't seem to rotate shapes unless they are polygons
-        #### - may need to manually define rectangles, ovals etc. so that they can be updated with canvas.coords()
-        #if non-zero angle, a rotation of these coords should be applied (complex numbers)
-        
-        #define bounding box (corners of shape to be drawn)
-        #assume centred at zero for now, so that they can be rotated as is
-        x_0,y_0 = previewcentre[0] - width//2, previewcentre[1] - height//2
-        x_1,y_1 = previewcentre[0] + width//2, previewcentre[1] + height//2
+        #all shapes drawn as polygons to allow rotation (ovals approximated by 360 points)
+        #scaled down by the relative size of the mini-canvas, and centred on it
+        #the rotated outline is cached per shape, size and angle (see shapes.outline_template)
+        coords = (outline_template(shape, width, height, angle).reshape(-1, 2) + previewcentre).ravel().tolist()
         
-        
-        if shape == "Oval":
-            #add shape, centred but scaled down by the relative size of the mini-canvas
-            #have to approximate an oval by polygon
-            #so need points (roughly) around all the angles, and scaled properly by major/minor axis
-            major_ax = (x_1 - x_0)//2
-            minor_ax = (y_1 - y_0)//2
-            
-            coords = []
-#             for i in range(360):
-                #scale by projections of circle (2pi radians) onto axes
-                #and factor in major/minor lengths
-#             angle_step = (i/360) * 2*np.pi
-            angle_step = (np.arange(360) / 360) * 2*np.pi
-
-            x_oval = major_ax * np.cos(angle_step)
-            y_oval = minor_ax * np.sin(angle_step)
-
-#             coords.append(x_oval + previewcentre[0])
-#             coords.append(y_oval + previewcentre[1])
-            coords = list(np.c_[x_oval + previewcentre[0], y_oval + previewcentre[1]].ravel())
-                
-            coords = self.rotate_coords(coords, angle, centre=previewcentre)
-            
-        elif shape == "Triangle":
-            coords = [x_0,y_1, previewcentre[0],y_0, x_1,y_1]
-            coords = self.rotate_coords(coords, angle, centre=previewcentre)
-            
-        elif shape == "Rectangle":
-            #manually set 4 corner points as polygon
-            coords = [x_0,y_0, x_0,y_1, x_1,y_1, x_1,y_0]
-            coords = self.rotate_coords(coords, angle, centre=previewcentre)
-            
-            
-        #all shapes created as polygons to allow rotation
-        drawn_preview = self.mini_canvas.create_polygon(*coords, **draw_opts)
+        #one polygon is kept on the mini-canvas, and reshaped and recoloured in place
+        if self.preview_item is None:
+            self.preview_item = self.mini_canvas.create_polygon(*coords, fill=drawcolour, width=0, tags="preview")
+        else:
+            self.mini_canvas.coords(self.preview_item, coords)
+            self.mini_canvas.itemconfigure(self.preview_item, fill=drawcolour, state="normal")
         return
     
     
     def draw_outline(self, event):
         #preview outline of shape around mouse pointer
+        #only the latest pointer position is kept - if the outline was drawn less than a frame ago,
+        #it is redrawn at the end of that frame (see refresh_outline), so fast movements don't queue up redraws
+        self.outline_position = event.x, event.y
+        if self.outline_job is None:
+            self.refresh_outline()
+        return
+    
+    
+    def refresh_outline(self):
+        #draw the outline at the latest pointer position, unless nothing has changed since it was last drawn
+        #then wait a frame before drawing again
+        self.outline_job = None
+        if self.outline_position is None:
+            return
         
         #get parameters for shape
         shape = self.shape_list.get()
@@ -360,50 +420,38 @@ class GUI():
         height = int(self.heightbox.get())
         width = int(self.widthbox.get())
         drawcolour = self.get_colour(self.redbox.get(), self.greenbox.get(), self.bluebox.get())
-        draw_opts = {"outline":drawcolour, "fill":"", "width":1, "dash":(2,2), "tags":"outline"}
         
         if shape == "Freehand Line":  # - no preview can be drawn for freehand
+            self.hide_outline()
             return
         
-        #check the rest
-        #others drawn by coordinate bounding boxes - (x0,y0,x1,y1)
-        #if non-zero- angle, a rotation of these coords should be applied (complex numbers)
-        x_0, y_0 =  event.x - width//2, event.y - height//2
-        x_1, y_1 =  event.x + width//2, event.y + height//2
+        state = (self.outline_position, shape, angle, width, height, drawcolour)
+        if state == self.outline_drawn:
+            return
         
+        #rotated outline of the shape about the origin (cached, see shapes.outline_template), moved to the pointer
+        coords = (outline_template(shape, width, height, angle).reshape(-1, 2) + self.outline_position).ravel().tolist()
         
-        self.maincanvas.delete("outline")
-        if shape == "Oval":
-            major_ax = (x_1 - x_0)//2
-            minor_ax = (y_1 - y_0)//2
-            
-            coords = []
-#             for i in range(360):
-                #scale by projections of circle (2pi radians) onto axes
-                #and factor in major/minor lengths
-#             angle_step = (i/360) * 2*np.pi
-            angle_step = (np.arange(360) / 360) * 2*np.pi
-
-            x_oval = major_ax * np.cos(angle_step)
-            y_oval = minor_ax * np.sin(angle_step)
-
-#             coords.append(x_oval + event.x)
-#             coords.append(y_oval + event.y)
-            coords = list(np.c_[x_oval + event.x, y_oval + event.y].ravel())
-                          
-            coords = self.rotate_coords(coords, angle, centre=[event.x,event.y])
-        elif shape == "Triangle":
-            coords = [x_0,y_1, event.x,y_0, x_1,y_1]
-            coords = self.rotate_coords(coords, angle, centre=[event.x,event.y])
-            
-        elif shape == "Rectangle":
-            #manually set 4 corner points as polygon
-            coords = [x_0,y_0, x_0,y_1, x_1,y_1, x_1,y_0]
-            coords = self.rotate_coords(coords, angle, centre=[event.x,event.y])
-            
-            
-        #all shapes created as polygons to allow rotation
-        drawn_preview = self.maincanvas.create_polygon(*coords, **draw_opts)
+        #one polygon is kept for the outline, and moved and reshaped in place rather than deleted and created again
+        if self.outline_item is None:
+            draw_opts = {"outline":drawcolour, "fill":"", "width":1, "dash":(2,2), "tags":"outline"}
+            self.outline_item = self.maincanvas.create_polygon(*coords, **draw_opts)
+        else:
+            self.maincanvas.coords(self.outline_item, coords)
+            self.maincanvas.itemconfigure(self.outline_item, outline=drawcolour, state="normal")
+        
+        self.outline_drawn = state
+        self.outline_job = self.window.after(self.outline_interval, self.refresh_outline)
+        return
+    
+    
+    def hide_outline(self):
+        #pointer has left the canvas (or is drawing freehand) - the outline is hidden until it's next drawn
+        if self.outline_job is not None:
+            self.window.after_cancel(self.outline_job)
+        self.outline_position, self.outline_drawn, self.outline_job = None, None, None
+        if self.outline_item is not None:
+            self.maincanvas.itemconfigure(self.outline_item, state="hidden")
         return
     
     
@@ -428,50 +476,18 @@ class GUI():
             self.draw_freehand(event)
             return
         
-        #check the rest
-        #others drawn by coordinate bounding boxes - (x0,y0,x1,y1)
-        #if non-zero- angle, a rotation of these coords should be applied (complex numbers)
-        x_0, y_0 =  event.x - width//2, event.y - height//2
-        x_1, y_1 =  event.x + width//2, event.y + height//2
-        
-        
-        if shape == "Oval":
-            major_ax = (x_1 - x_0)//2
-            minor_ax = (y_1 - y_0)//2
-            
-            coords = []
-#             for i in range(360):
-                #scale by projections of circle (2pi radians) onto axes
-                #and factor in major/minor lengths
-#             angle_step = (i/360) * 2*np.pi
-            angle_step = (np.arange(360) / 360) * 2*np.pi
-
-            x_oval = major_ax * np.cos(angle_step)
-            y_oval = minor_ax * np.sin(angle_step)
-
-#             coords.append(x_oval + event.x)
-#             coords.append(y_oval + event.y)
-            coords = list(np.c_[x_oval + event.x, y_oval + event.y].ravel())
-                          
-            coords = self.rotate_coords(coords, angle, centre=[event.x,event.y])
-        elif shape == "Triangle":
-            coords = [x_0,y_1, event.x,y_0, x_1,y_1]
-            coords = self.rotate_coords(coords, angle, centre=[event.x,event.y])
-            
-        elif shape == "Rectangle":
-            #manually set 4 corner points as polygon
-            coords = [x_0,y_0, x_0,y_1, x_1,y_1, x_1,y_0]
-            coords = self.rotate_coords(coords, angle, centre=[event.x,event.y])
-            
+        #polygon coordinates of the shape, rotated about the clicked point
+        coords = outline_coords(shape, (event.x, event.y), width, height, angle)
             
         #all shapes created as polygons to allow rotation
         drawn_shape = self.maincanvas.create_polygon(*coords, **draw_opts)
         
-        #put axes on top so they can be seen at all times
+        #put axes on top so they can be seen at all times, and the outline above the new shape
         if self.axes_toggle.get() == 1:
             self.maincanvas.tag_raise("axis", "all")
+        self.maincanvas.tag_raise("outline")
         
-        self.add_new_potential()
+        self.add_new_potential(shape, (event.x, event.y), width, height, angle)
         return
     
     
@@ -573,151 +589,382 @@ class GUI():
         return
     
     
-    def rotate_coords(self, coords, angle, centre=None):
-        #apply simple rotation in complex plane
-        #retrieve new coords from rotated complex value
-        if centre is None:
-            centre = [0,0]
-        
-        #apply e^ix rotation in complex plane, with angular fraction included
-        #remove offset from coords - to rotate around origin
-        #add back afterwards
-        x_complex = np.array(coords[::2]) * complex(1,0)  - centre[0]
-        y_complex = np.array(coords[1::2]) * complex(0,1)  - (centre[1] * 1j)
-        
-        rotated_points = (x_complex + y_complex) * np.exp(1j * (angle/360) * 2*np.pi)
-        x_new, y_new = rotated_points.real + centre[0], rotated_points.imag + centre[1]
-        
-        new_coords = np.c_[x_new, y_new].ravel()  # - recombine the np arrays to alternating x,y pairs
-        
-        return new_coords
-    
-    
     def get_colour(self, r,g,b):
         #supply rgb values and get a hex colour code in return
         r,g,b = [int(colour) for colour in (r,g,b)]
         return "#%02x%02x%02x" % (r,g,b)
     
     
-    def add_new_potential(self):
+    def add_new_potential(self, shape=None, centre=None, width=0, height=0, angle=0):
         #create array for a new shape, then add it to total array
         #NOTE: not sure how to make work with freehand line, as they have no coords() to access
+        #only the shape's bounding box is rasterized, and only that slice of the arrays is updated
+        #the rectangle, oval and triangle from draw_shape are tested analytically from their parameters
+        #anything else falls back to testing the canvas polygon's coordinates
         potential = float(self.potentialbox.get())
+        grid_shape = self.maskarray.shape
         
-        shape_bounds = self.maincanvas.coords("current")
-        if not shape_bounds:
-            return            
-        shape_bounds = list(zip(shape_bounds[::2], shape_bounds[1::2]))  # - specific (x,y) tuple format needed for Path
-
-        test_grid = np.vstack(np.indices((self.canvas_width, self.canvas_height)).T)  # - specific Nx2 format needed for Path
-        shape_mask = Path(shape_bounds).contains_points(test_grid, radius=1).reshape(self.canvas_height, self.canvas_width)
+        if shape in ("Rectangle", "Oval", "Triangle"):
+            region, shape_mask = rasterize_shape(shape, centre, width, height, angle, grid_shape)
+            self.scene.add_shape(shape, centre, width, height, angle, potential, self.boundary_toggle.get() == 1,
+                                 self.get_colour(self.redbox.get(), self.greenbox.get(), self.bluebox.get()))
+            self.scene_version += 1
+        else:
+            shape_bounds = self.maincanvas.coords("current")
+            if not shape_bounds:
+                return
+            region, shape_mask = rasterize_polygon(shape_bounds, grid_shape)
+            self.scene_incomplete = True
         
+        if region is None:  # - entirely off the canvas
+            return
+        
+        self.edited_region[region] = True
+        
+        #views of the arrays within the bounding box - updating these updates the full arrays
+        maskarray = self.maskarray[region]
+        potentialarray = self.potentialarray[region]
         
         #generate potential array by multiplying individual mask, and add this to main potential array
         #checks needed to remove overlaps
         shape_potential = potential * shape_mask  # - as shape_mask is Boolean (1/0), multiplying 1s to give potential; zero elsewhere
         
-        #summed arrays to update
-        #manually reset the invalid values (i.e. overlaps - where mask > 1)
-        #also for potentials, check if overlap's total value is greater than current potential, overwrite with this value
-        self.maskarray += shape_mask
+        #arrays to update
+        #for potentials, check if overlap's total value is greater than current potential, overwrite with this value
         
-        #check if setting to boundary (1) or background (0)
+        #check if setting to boundary (True) or background (False)
         #then reset mask and put potential back to zero (background)
         if self.boundary_toggle.get() == 0:
-            self.maskarray[shape_mask] = 0
-            self.potentialarray[shape_mask] = 0
+            maskarray[shape_mask] = False
+            potentialarray[shape_mask] = 0
         else:
-            #flag points as boundary conditions
-            self.maskarray[self.maskarray > 1] = 1
+            #flag points as boundary conditions (Boolean mask, so overlaps stay True)
+            maskarray |= shape_mask
             
             #add the new potential
             #check if the added points came to a total sum not equal to the current potential - then values should be reset manually
-            self.potentialarray += shape_potential
-            self.potentialarray[(shape_mask == True) & (self.potentialarray != potential)] = potential
+            potentialarray += shape_potential
+            potentialarray[(shape_mask == True) & (potentialarray != potential)] = potential
         
         
         return
     
     
+    def save_scene(self, filename=None):
+        #save the shapes drawn so far as a JSON scene file - asks for a file name if none is given
+        if filename is None:
+            filename = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Scene files", "*.json")])
+            if not filename:
+                return
+        self.scene.save(filename)
+        return
+    
+    
+    def load_scene(self, filename=None):
+        #replace the canvas with the shapes of a saved scene file - asks for a file name if none is given
+        #shapes are redrawn on the canvas, and the mask and potential arrays rasterized from the scene in one pass
+        #not while a solve is running - the rasterizer is a parallel kernel, and numba's parallel kernels mustn't run
+        #on two threads at once (the button is disabled meanwhile, see output_arrays)
+        if self.solving:
+            return
+        if filename is None:
+            filename = filedialog.askopenfilename(filetypes=[("Scene files", "*.json")])
+            if not filename:
+                return
+        scene = Scene.load(filename)
+        
+        self.clear_canvas()
+        for shape in scene.shapes:
+            coords = outline_coords(shape["type"], shape["centre"], shape["width"], shape["height"], shape["angle"])
+            self.maincanvas.create_polygon(*coords, outline=shape["colour"], fill=shape["colour"], width=1, tags="shape")
+        if self.axes_toggle.get() == 1:
+            self.maincanvas.tag_raise("axis", "all")
+        
+        self.wait_for_warm_up()
+        maskarray, potentialarray = scene.rasterize(self.maskarray.shape)
+        self.maskarray[:] = maskarray
+        self.potentialarray[:] = potentialarray
+        self.scene = scene
+        self.scene_version += 1
+        self.scene_incomplete = False
+        return
+    
+    
+    def conductor_basis(self, boundary="periodic", **options):
+        #unit solution of every conductor drawn so far (see superposition.py), for sweeping the electrode voltages
+        #e.g. basis = gui.conductor_basis(); potentials = basis.potentials([10, -10]); C = basis.capacitance_matrix()
+        #solved in the foreground - the basis is only valid until the conductors on the canvas change
+        from superposition import ConductorBasis
+        self.wait_for_warm_up()
+        return ConductorBasis(~self.maskarray, self.potentialarray, boundary, **options)
+    
+    
     def output_arrays(self):
-        #once canvas finished, can save the arrays to txt files for processing in electric field solver
+        #once canvas finished, process for the electric field and save the arrays for use elsewhere
         #mask array is output with background at 1 and boundaries at 0
         #by convention of the rest of the program - editable points are "True" (1)
         
-        self.processbutton.configure(text="Solving for potential values...")
-        self.window.update()
-        
-        np.savetxt("maskarray.txt", 1 - self.maskarray, delimiter=" ", fmt="%f")
-        np.savetxt("potentialarray.txt", self.potentialarray, delimiter=" ", fmt = "%f")
+        #the solve runs on a separate thread, so the window stays responsive and it can be cancelled
+        #only one solve at a time - the button is disabled until it finishes
+        self.processbutton.configure(text="Solving for potential values...", state=DISABLED)
+        self.loadscenebutton.configure(state=DISABLED)
+
+        #image of the shapes on the canvas to draw the field over (see Scene.render) - from a copy of the scene taken now,
+        #so it matches the arrays being solved even if the canvas is edited meanwhile
+        #rendered on the solver thread, as its compiled kernel has to wait for the warm-up (waiting here would freeze
+        #the window) - unless the shapes are unchanged since the last one
+        #with shapes missing from the scene there's no image, and the mask is drawn instead (see show_output)
+        if self.scene_incomplete:
+            scene, image = None, None
+        elif self.shapes_image is not None and self.shapes_image[0] == self.scene_version:
+            scene, image = None, self.shapes_image[1]
+        else:
+            scene, image = Scene.from_dict(self.scene.to_dict()), None
+        self.solve_scene_version = self.scene_version
+        
+        #open the output window straight away, showing progress until the solution is ready
+        self.outputwindow = Toplevel(self.window)
+        self.outputwindow.title("Calculated Electric Field")
+        self.outputwindow.geometry("{0}x{1}+0+0".format(self.canvas_width + 200, self.canvas_height + 200))
+        
+        self.progresslabel = Label(self.outputwindow, text="Starting solver...", font=("Calibri",11))
+        self.progresslabel.grid(row=0, column=1, pady=10)
+        self.cancelbutton = Button(self.outputwindow, text="Cancel", bg="gainsboro", font=("Calibri",11), command=self.cancel_solve)
+        self.cancelbutton.grid(row=2, column=1)
+        self.cancelbutton["borderwidth"] = 0.5
+        self.cancelbutton["relief"] = "ridge"
+        self.outputwindow.protocol("WM_DELETE_WINDOW", self.cancel_solve)  # - closing the window also cancels
+        self.output_canvas = None  # - the plot is made with the first preview (or the solution), see output_axes
+        
+        #warm-start from the last solution, with any points edited since then reset to their initial values
+        #the edits are remembered in case this solve doesn't finish
+        #with everything edited (e.g. after clearing the canvas or loading a scene) the solve starts cold, so the
+        #solver can make its own starting guess
+        if hasattr(self, "final_potentials") and not self.edited_region.all():
+            initial = np.where(self.edited_region, self.potentialarray, self.final_potentials)
+        else:
+            initial = None
+        self.solve_edited = self.edited_region
+        self.solve_mask = self.maskarray.copy()
+        self.edited_region = np.zeros(self.maskarray.shape, dtype=bool)
+        
+        #solver thread reports back through the queue, and checks the event to see if it should stop
+        #copies of the arrays are passed, so drawing on the canvas during the solve doesn't affect it
+        self.solve_queue = queue.Queue()
+        self.solve_cancelled = threading.Event()
+        self.solving = True
+        self.solve_stage = ""
+        solve_thread = threading.Thread(target=self.background_solve, daemon=True,
+                                        args=(self.solver_list.get(), ~self.maskarray, self.potentialarray.copy(), initial,
+                                              list(self.export_formats), self.export_directory, self.solve_dtype,
+                                              list(self.preview_factors), self.field_style, scene, image))
+        solve_thread.start()
+        
+        self.window.after(100, self.check_solve)
+        return
+    
+    
+    def background_solve(self, solver, maskarray, potentialarray, initial=None, export_formats=(), export_directory=".", dtype=np.float64,
+                         preview_factors=(), field_style="streamlines", scene=None, image=None):
+        #runs on the solver thread - must not touch any tkinter widgets, only put messages on the queue
+        #the image of the scene drawn under the field is rendered here, if not given
+        self.wait_for_warm_up()
+        def progress(iteration, maxchange):
+            self.solve_queue.put(("progress", iteration, maxchange))
+            return self.solve_cancelled.is_set()
         
-        #process inputs of initial/boundary conditions
+        try:
+            #previews: SOR solves of the canvas coarsened by each factor, each starting from the one before
+            #the last of them is the starting guess for a full grid SOR solve, unless the previous solution is being reused
+            #the other engines solve the full grid in about the time all the previews take (and make their own starting
+            #guess, if any), so only get the quickest, coarsest preview
+            if solver != "SOR":
+                preview_factors = [max(preview_factors)] if len(preview_factors) else []
+            guess = None
+            for factor in preview_factors:
+                coarse_mask, coarse_potentials = coarsen(maskarray, potentialarray, factor)
+                if min(coarse_mask.shape) < 8:  # - too coarse to show anything
+                    continue
+                self.solve_queue.put(("level", factor))
+                coarse_initial = None if guess is None else guess[::factor, ::factor]
+                coarse = sor(coarse_mask, coarse_potentials, f="auto", rtol=1e-4, boundary="periodic", chebyshev=True,
+                             callback=progress, initial=coarse_initial, dtype=dtype)
+                if self.solve_cancelled.is_set():
+                    self.solve_queue.put(("cancelled",))
+                    return
+                #field per canvas point, rather than per coarse point
+                Ex, Ey = field_arrays(coarse, "periodic", dtype=dtype)[:2]
+                self.solve_queue.put(("preview", factor, coarse, Ex / factor, Ey / factor))
+                guess = refine(coarse, factor, maskarray.shape)
+            
+            if guess is not None:
+                self.solve_queue.put(("level", 1))
+                if solver == "SOR" and initial is None:
+                    initial = guess
+            
+            if solver == "Multigrid":
+                final_potentials = multigrid(maskarray, potentialarray, rtol=1e-4, boundary="periodic", callback=progress, initial=initial)
+            elif solver == "Sparse Direct":
+                final_potentials = sparse_direct(maskarray, potentialarray, boundary="periodic")
+            elif solver == "Spectral":
+                final_potentials = spectral(maskarray, potentialarray, rtol=1e-4, boundary="periodic", callback=progress)
+            else:
+                final_potentials = sor(maskarray, potentialarray, f="auto", rtol=1e-4, boundary="periodic", chebyshev=True, callback=progress, initial=initial, dtype=dtype)
+            
+            if self.solve_cancelled.is_set():
+                self.solve_queue.put(("cancelled",))
+                return
+            
+            self.solve_queue.put(("field",))
+            #field and its magnitude in one pass, with gradients wrapping round the edges as the solve did
+            Ex, Ey = field_arrays(final_potentials, "periodic", dtype=dtype)[:2]
+            Efield = [Ex, Ey]
+            #streamlines in particular can take longer to trace than the solve - done here rather than when drawing,
+            #then kept with the solution so every redraw is quick (see cache_field)
+            shapes = {}
+            prepare_field(Ex, Ey, field_style, shapes)
+            
+            if export_formats:
+                self.solve_queue.put(("export",))
+                export_arrays(solution_arrays(maskarray, potentialarray, final_potentials, Efield), export_directory, export_formats)
+            if image is None and scene is not None:
+                image = scene.render(maskarray.shape)
+            self.solve_queue.put(("done", final_potentials, Efield, shapes, image))
+        except Exception as error:
+            self.solve_queue.put(("error", error))
+        return
+    
+    
+    def check_solve(self):
+        #poll the solver thread's messages from the tkinter main loop, updating the output window
+        #reschedules itself until the solver has finished, failed, or been cancelled
+        while not self.solve_queue.empty():
+            message = self.solve_queue.get()
+            
+            if message[0] == "progress":
+                self.progresslabel.configure(text="Solving{0}... iteration {1}, max change {2:.3g} V".format(self.solve_stage, *message[1:]))
+            elif message[0] == "level":
+                self.solve_stage = " at 1/{0} resolution".format(message[1]) if message[1] > 1 else " at full resolution"
+                self.progresslabel.configure(text="Solving{0}...".format(self.solve_stage))
+            elif message[0] == "preview":
+                self.show_preview(*message[1:])
+            elif message[0] == "field":
+                self.progresslabel.configure(text="Getting the electric field...")
+            elif message[0] == "export":
+                self.progresslabel.configure(text="Saving arrays...")
+            elif message[0] == "done":
+                self.solving = False
+                self.final_potentials, self.Efield = message[1], message[2]
+                self.solution_image = message[4]
+                self.solution_mask = self.solve_mask
+                if message[4] is not None:
+                    self.shapes_image = (self.solve_scene_version, message[4])
+                self.cache_field(message[3])
+                self.processbutton.configure(text="Process Canvas", state=NORMAL)
+                self.loadscenebutton.configure(state=NORMAL)
+                self.show_output()
+                return
+            else:
+                #cancelled or failed - nothing to show, and the edits still need solving next time
+                self.solving = False
+                self.edited_region |= self.solve_edited
+                self.processbutton.configure(text="Process Canvas", state=NORMAL)
+                self.loadscenebutton.configure(state=NORMAL)
+                if message[0] == "error":
+                    self.progresslabel.configure(text="Solver failed: {0}".format(message[1]))
+                    self.cancelbutton.configure(text="Close", command=self.outputwindow.destroy)
+                    self.outputwindow.protocol("WM_DELETE_WINDOW", self.outputwindow.destroy)
+                else:
+                    self.outputwindow.destroy()
+                return
+        
+        self.window.after(100, self.check_solve)
+        return
+    
+    
+    def cancel_solve(self):
+        #ask the solver thread to stop at its next progress report - nothing to do once it has finished
+        if not self.solving:
+            return
+        self.solve_cancelled.set()
+        self.progresslabel.configure(text="Cancelling...")
+        self.cancelbutton.configure(state=DISABLED)
+        return
+    
+    
+    def cache_field(self, shapes=None):
+        #quantities derived from the field for plotting, worked out once per solve
+        #so showing the output or re-plotting the field (plot("field")) recomputes nothing
+        #"shapes" is the cache of rendering.draw_field - the field lines etc. of each style drawn so far
+        ny, nx = self.Efield[0].shape
+        self.field_cache = {"x":np.arange(nx), "y":np.arange(ny), "shapes":{} if shapes is None else shapes}
+        return
+    
+    
+    def output_axes(self):
+        #axes of the plot embedded in the output window - the figure is made for the window's first plot (a preview,
+        #or the solution) and cleared for each one after, so the window updates in place as the solve refines
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg  # - embed plots in window
         
-#         self.finite_difference()
-        self.final_potentials = sor(1 - self.maskarray, self.potentialarray, f=1.9825, rtol=1e-4, boundary="periodic")
-        self.processbutton.configure(text="Getting the electric field...")
-        self.window.update()
-        self.Efield = get_Efield(self.final_potentials)
+        if self.output_canvas is None:
+            fig = plt.figure(figsize=(self.canvas_width/100,self.canvas_height/100), dpi=100)
+            fig.add_subplot(111)
+            self.output_canvas = FigureCanvasTkAgg(fig, master=self.outputwindow)
+            self.output_canvas.get_tk_widget().grid(row=1, column=1, sticky="NEWS")
         
-        self.processbutton.configure(text="Process Canvas")
-        self.window.update()
-
-        #save postscipt image and convert to a png to be read in
-        #if possible, but if ghostscript is not installed we move on without the image
-        try:
-            filename = "tk_canvas"
-            self.maincanvas.postscript(file = filename + '.eps', pagewidth=self.canvas_width-1, pageheight=self.canvas_height-1) 
-            # use PIL to convert to PNG
-            img = Image.open(filename + '.eps') 
-            img.save(filename + '.png', 'png')
-        except:
-            pass            
-        finally:
-        
-#         x = self.window.winfo_rootx() + self.maincanvas.winfo_x()
-#         y = self.window.winfo_rooty() + self.maincanvas.winfo_y()
-#         x1 = x + self.maincanvas.winfo_width()
-#         y1 = y + self.maincanvas.winfo_height()
-#         print(x,y)
-#         print(x1,y1)
-#         ImageGrab.grab().crop((x+50,y+50,x1+100,y1+100)).save("tk_canvas.png")
-    
-    
-            #would add callback (either to this function or from this function) to run processing for rest of solver
-            #i.e. the "control system", which begins from a button on canvas and outputs into the GUI
-            self.outputwindow = Toplevel(self.window)
-            self.outputwindow.title("Calculated Electric Field")
-            self.outputwindow.geometry("{0}x{1}+0+0".format(self.canvas_width + 200, self.canvas_height + 200))
-
-            self.savebutton = Button(self.outputwindow, text="Save Output Plot", bg="gainsboro", font=("Calibri",11), command = lambda: plt.savefig("Efield.png"))
-            self.savebutton.grid(row=2,column=1)
-            self.savebutton["borderwidth"] = 0.5
-            self.savebutton["relief"] = "ridge"
+        ax = self.output_canvas.figure.axes[0]
+        ax.clear()
+        return ax
+    
+    
+    def show_preview(self, factor, potentials, Ex, Ey):
+        #plot a coarse solution (see background_solve) while the finer ones are worked out
+        #the potential is shown stretched over the canvas, with arrows of the field's direction about every 16 points
+        #(a streamplot takes seconds to trace, even on a coarse grid - too long for a preview)
+        ax = self.output_axes()
+        ny, nx = potentials.shape
+        x = factor * np.arange(nx) + (factor - 1) / 2
+        y = factor * np.arange(ny) + (factor - 1) / 2
+        
+        vmax = np.abs(potentials).max() or 1
+        ax.imshow(potentials, cmap="PRGn_r", vmin=-vmax, vmax=vmax, extent=(-0.5, factor*nx - 0.5, factor*ny - 0.5, -0.5))
+        draw_field(ax, Ex, Ey, "quiver", x=x, y=y, spacing=16)
+        ax.set_xlim(-0.5, self.canvas_width - 0.5)
+        ax.set_ylim(self.canvas_height - 0.5, -0.5)
+        
+        self.output_canvas.draw()
+        return
+    
+    
+    def show_output(self):
+        #would add callback (either to this function or from this function) to run processing for rest of solver
+        #i.e. the "control system", which begins from a button on canvas and outputs into the GUI
+        self.progresslabel.grid_remove()
+        self.cancelbutton.grid_remove()
+        self.outputwindow.protocol("WM_DELETE_WINDOW", self.outputwindow.destroy)
+        
+        self.savebutton = Button(self.outputwindow, text="Save Output Plot", bg="gainsboro", font=("Calibri",11), command = lambda: self.output_canvas.figure.savefig("Efield.png"))
+        self.savebutton.grid(row=2,column=1)
+        self.savebutton["borderwidth"] = 0.5
+        self.savebutton["relief"] = "ridge"
 
 
-            fig = plt.figure(figsize=(self.canvas_width/100,self.canvas_height/100), dpi=100)
-            ax = fig.add_subplot(111)
+        #the plot replaces any preview in the same window
+        ax = self.output_axes()
 
-            #draw user's input image
-            #attempt to use the original image
-            #but since tkinter is awkward with saving canvas, may have errors if ghostscript not installed (add earlier check)
-            #use the mask array as a backup to overlay the field lines
-            try:
-                img = mpimg.imread("tk_canvas.png")
-                ax.imshow(img)
-            except:
-                ax.imshow(1 - self.maskarray)
+        #draw user's input image (see output_arrays), or the boundaries of the mask solved when there isn't one
+        if self.solution_image is not None:
+            ax.imshow(self.solution_image)
+        else:
+            ax.imshow(self.solution_mask, cmap="gist_gray_r")
 
-            #overlay the streamplot of E-field vector lines
-            x = np.arange(0, self.final_potentials.shape[1])
-            y = np.arange(0, self.final_potentials.shape[0])
-            X,Y = np.meshgrid(x,y)
-            ax.streamplot(X,Y, *self.Efield, linewidth=0.5, density=1.5)
+        #overlay the E-field vector lines (traced once per solve and cached, see cache_field)
+        field = self.field_cache
+        draw_field(ax, *self.Efield, self.field_style, field["shapes"], field["x"], field["y"])
 
 
-            self.output_canvas = FigureCanvasTkAgg(fig, master=self.outputwindow)
-            self.output_canvas.draw()
-            self.output_canvas.get_tk_widget().grid(row=1, column=1, sticky="NEWS")
+        self.output_canvas.draw()
         
         return
     
@@ -743,8 +990,12 @@ class GUI():
     
     
     def styled_plot(self, plot_type="solution"):
+        import matplotlib.pyplot as plt
+        import matplotlib.cm as cm
+        from matplotlib.colors import Normalize
+        
         if plot_type == "mask":
-            arr = 1 - self.maskarray
+            arr = ~self.maskarray
             current_cmap = cm.get_cmap("gist_gray",2)
             norm = None
 
@@ -763,15 +1014,14 @@ class GUI():
             norm = Normalize(vmin,vmax)
 
         elif plot_type == "field":
-            try:
-    #             1/0
-                arr = mpimg.imread("tk_canvas.png")
-                current_cmap = cm.get_cmap("PRGn_r")
-            except:
-                arr = self.maskarray
+            #the canvas as it was when solved, an RGB image (see output_arrays) - or its mask if there's no image
+            if self.solution_image is not None:
+                arr = self.solution_image
+                current_cmap = None
+            else:
+                arr = self.solution_mask
                 current_cmap = cm.get_cmap("gist_gray_r")
-            finally:
-                norm = None
+            norm = None
 
         fig = plt.figure(figsize=(self.canvas_width//100, self.canvas_height//100), dpi=100)
         ax = plt.axes((0,0,1,1))
@@ -790,13 +1040,9 @@ class GUI():
             cb.outline.set_edgecolor("gray")
             cb.outline.set_linewidth(0.8)
         else:
-            x = np.arange(0, self.final_potentials.shape[1])
-            y = np.arange(0, self.final_potentials.shape[0])
-            X,Y = np.meshgrid(x,y)
-            E_mod = np.sqrt(self.Efield[0] ** 2 + self.Efield[1] ** 2)
-            lognorm = LogNorm(vmin=np.nanmin(E_mod)+1e-20, vmax=np.nanmax(E_mod))
-            nm = Normalize(np.nanmin(E_mod), np.nanmax(E_mod))
-            sp = ax.streamplot(X,Y, *self.Efield, linewidth=0.5, density=1.5)#, norm=nm, color=E_mod**(4), cmap="RdBu")
+            #coordinates and traced field shapes are cached after each solve (see cache_field)
+            field = self.field_cache
+            draw_field(ax, *self.Efield, self.field_style, field["shapes"], field["x"], field["y"])
     #         cb = plt.colorbar(sp.lines, shrink=0.8, aspect=25)
 
         if plot_type == "mask":
@@ -820,8 +1066,8 @@ class GUI():
         return
     
     
-def create(width=600, height=500):
+def create(width=600, height=500, warm_up=True):
     root = Tk()
-    g = GUI(root, width, height)
+    g = GUI(root, width, height, warm_up)
     root.mainloop()
     return g
\ No newline at end of file
@@ -1,103 +1,1080 @@
 """Separate module for any finite-difference/electric field calculations to be accessed from the GUI.
 These are functions which should not depend on any GUI class/instance attributes.
 """
+import collections
+import hashlib
+import threading
+import time
+
 import numpy as np
-import scipy.ndimage
-import scipy.signal
 
 import numba
 from numba import jit
 
+#scipy is slow to import, so it is imported within the functions that use it - only numpy and numba are needed
+#to load this module (and so to open the GUI)
+#the compiled kernels are cached on disk (cache=True), so are only compiled once, not on every run - see warm_up
+
+#the GUI runs the solvers on a worker thread, and the TBB threading layer can hang the interpreter on exit after that
+numba.config.THREADING_LAYER_PRIORITY = ["omp", "workqueue", "tbb"]
+
 
-def finite_difference(maskarray, potentialarray):
+def finite_difference(maskarray, potentialarray, initial=None, dtype=np.float64, callback=None, diagnostics=False, sample_every=100,
+                      stop="change", rtol=1e-4, atol=0.0, norm="inf", check_every=50, maxiter=None, boundary="nearest"):
         #use a simple finite-difference process using the average of 4 neighbouring points
         #combine with error tolerance to use the "Jacobi" iteration scheme
         #calculate the numerical values which satisfy Laplace's equation in 2D
         #for the initial boundaries provided
-        #the finite-difference equation can be performed as a convolution with a 3x3 kernel of weights for each grid point
+        #each iteration averages shifted slices of the whole grid into a second, preallocated buffer (see _jacobi_average),
+        #and the two buffers swap roles every iteration - so no arrays are allocated inside the loop
+        #boundary sets how the edges of the grid are treated:
+        #"nearest" - edge points are updated, taking their missing neighbours from themselves (the original behaviour,
+        #as scipy.ndimage.convolve with mode="nearest"), "fixed" - edge points are never updated (as in sor),
+        #"periodic" - edges wrap round to the opposite side
+        #an "initial" guess for the editable points can be given, e.g. a previous solution (see _initial_field)
+        #dtype=np.float32 solves in single precision (see precision_error)
+        #callback(iteration, measure) is called after every iteration (every check_every with stop="residual") with the
+        #largest change in the iteration, or the residual - returning True stops the solve early
+        #with diagnostics=True, a Diagnostics record is returned as well as the solution (residual every sample_every iterations)
+        #stop="change" finishes once successive iterations agree to within rtol (as np.allclose)
+        #stop="residual" finishes once the residual over the non-edge free points is at most atol + rtol * (largest fixed
+        #potential), checked every check_every iterations (as in sor) - either way stopping after maxiter iterations if given
+        
+        if stop not in ("change", "residual"):
+            raise ValueError("Unknown stopping criterion '{0}' - expected 'change' or 'residual'.".format(stop))
+        
+        info = Diagnostics("finite_difference") if diagnostics else None
+        start = time.perf_counter() if diagnostics else None
+        
+        mask = np.asarray(maskarray, dtype=bool)
+        periodic = boundary == "periodic"
+        #points updated each iteration, and the residual is measured away from the edges unless they wrap round
+        updated = mask if boundary == "nearest" else _free_points(mask, boundary)
+        residual_boundary = "periodic" if periodic else "fixed"
+        free = _free_points(mask, residual_boundary)
+        kept = ~updated
         
-        conv_factor = 1 * np.array([[0, 1/4, 0], [1/4, 0, 1/4], [0, 1/4, 0]])
+        v = np.ascontiguousarray(_initial_field(potentialarray, initial, updated, dtype))
+        new = np.empty_like(v)
+        #scratch buffers for the convergence test and residual
+        change, scale = np.empty_like(v), np.empty_like(v)
+        close = np.empty(v.shape, dtype=bool)
+        column = np.empty(v.shape[0], dtype=v.dtype)
+        rowmax, rowsquares = np.zeros(mask.shape[0]), np.zeros(mask.shape[0])
+        threshold = atol + rtol * np.abs(v[~mask]).max(initial=0)
+        vmax = 1.001 * np.abs(v).max(initial=0)
+        start = _lap(info, "setup", start)
         
-        v_q_plus = potentialarray.copy()
-        while True:
-            v_q = v_q_plus.copy()
+        iteration = 0
+        converged = False
+        while maxiter is None or iteration < maxiter:
+            _jacobi_average(v, new, periodic, column)
+            np.copyto(new, v, where=kept)
+            iteration += 1
 
-            v_q_plus[maskarray == True] = scipy.ndimage.convolve(v_q, conv_factor, mode="nearest")[maskarray == True]
-#             v_q_plus[maskarray == True] = scipy.signal.convolve(v_q, conv_factor, mode="same", method="fft")[maskarray == True]
+            if stop == "change":
+                #np.allclose(new, v, rtol=rtol) - |new - v| <= 1e-8 + rtol * |v| at every point - computed in place
+                #it can only hold once the largest change passes against the largest potential, which averaging never
+                #increases, so the full test is skipped until then (vmax has a little slack for rounding)
+                np.subtract(new, v, out=change)
+                np.abs(change, out=change)
+                measure = change.max()
+                converged = measure <= 1e-8 + rtol * vmax
+                if converged:
+                    np.abs(v, out=scale)
+                    np.multiply(scale, rtol, out=scale)
+                    np.add(scale, 1e-8, out=scale)
+                    converged = np.less_equal(change, scale, out=close).all()
+            elif iteration % check_every == 0:
+                measure = _residual_norm(new, free, periodic, norm, rowmax, rowsquares)
+                converged = measure <= threshold
+            else:
+                measure = None
+            v, new = new, v
 
-            if np.allclose(v_q_plus, v_q, rtol=1e-4):
+            if info is not None and iteration % sample_every == 0:
+                start = _lap(info, "iterations", start)
+                info.residuals.append((iteration, residual(mask, v, residual_boundary)))
+                start = _lap(info, "diagnostics", start)
+            if callback is not None and measure is not None and callback(iteration, measure):
+                break
+            if converged:
                 break
         
-        final_potentials = v_q_plus.copy()
-        
-        return final_potentials
+        if info is not None:
+            _lap(info, "iterations", start)
+            info.converged = converged
+            return v, info.finish(iteration, mask, v, residual_boundary)
+        return v
+
+
+def _jacobi_average(v, out, periodic, column):
+    #average of the 4 neighbours of every point of v, written into out without temporary arrays
+    #(v and out are C-contiguous arrays of the same shape, and column a buffer the length of a column)
+    #each neighbour is a shifted slice of the whole grid, added in the same order as the terms of
+    #scipy.ndimage.convolve (up, left, right, down), so in double precision the result is identical to the convolution
+    #the neighbours missing at the edges wrap round if periodic, otherwise are the edge points themselves ("nearest")
+    #
+    #left and right neighbours are added along the flattened grid, a single contiguous pass several times quicker
+    #than shifting the 2D columns - this wrongly adds the end of the neighbouring row to the edge column,
+    #so the edge column is worked out separately first and put back afterwards
+    first, last = (-1, 0) if periodic else (0, -1)
+    flat, vflat = out.reshape(-1), v.reshape(-1)
+    out[1:] = v[:-1]
+    out[0] = v[first]
+    np.add(out[:,0], v[:,first], out=column)
+    np.add(flat[1:], vflat[:-1], out=flat[1:])
+    out[:,0] = column
+    np.add(out[:,-1], v[:,last], out=column)
+    np.add(flat[:-1], vflat[1:], out=flat[:-1])
+    out[:,-1] = column
+    np.add(out[:-1], v[1:], out=out[:-1])
+    np.add(out[-1], v[last], out=out[-1])
+    np.multiply(out, 0.25, out=out)
+    return out
     
     
-@jit(parallel=True)
-def sor(maskarray, potentialarray, f=1, rtol=1e-4, boundary="fixed"):
+def sor(maskarray, potentialarray, f=1, rtol=1e-4, boundary="fixed", chebyshev=False, callback=None, initial=None, dtype=np.float64,
+        diagnostics=False, sample_every=100, stop="change", atol=0.0, norm="inf", check_every=50, maxiter=None, active="auto"):
     #successive over-relaxation method
     #using a relaxation parameter "f" to apply weighting to current point vs other points in 5-point stencil
     #f should default to 1 - this is simple Gauss-Seidel; however for quickest results we aim for high f < 2
-    #along with Gauss-Seidel selection - using updated points as soon as available
-    #speed up using numba.jit - caching the processes to be executed much faster
-    #accelerate using parallel execution via numba - numba.prange() replaces python's range()
+    #f="auto" picks the optimal value for this mask and boundary type (see optimal_relaxation)
+    #with chebyshev=True, f is instead ramped from 1 up to its final value over the first sweeps (Chebyshev acceleration)
+    #points are updated in red-black (checkerboard) order: every "red" point (k+l even) only neighbours "black"
+    #points and vice versa, so each colour can be updated in place in parallel without threads racing
+    #the sweeps run in a numba-compiled kernel
+    #with active=True the kernel only visits the free points, from lists of them made once (see _active_cells),
+    #so the work per sweep scales with the number of free points rather than the whole grid - worth it when conductors
+    #cover much of the canvas, but a little slower than scanning the mask when most points are free
+    #active="auto" uses the lists when fewer than half of the points are free
+    #
+    #stopping criteria:
+    #stop="change" finishes once no point changes by more than rtol relative to its previous value in a sweep
+    #(the kernel tracks the change made to every point on every sweep)
+    #stop="residual" instead finishes once the residual of Laplace's equation over the free points (see residual())
+    #is at most atol + rtol * (largest fixed potential), in the given norm ("inf" or "2") - only checked every
+    #check_every sweeps, and the per-point change tracking is skipped, so the sweeps themselves are cheaper
+    #the residual bounds the actual error, unlike the change per sweep, which is small whenever convergence is slow
+    #(note the error can be many times the residual on large grids, so residual tolerances should be small)
+    #either way, the solve also stops after maxiter sweeps if given
+    #
+    #callback(iteration, measure) is called after every block of sweeps - returning True stops the solve early
+    #the measure is the largest change in the last sweep, or the residual with stop="residual"
+    #an "initial" guess for the editable points can be given, e.g. a previous solution (see _initial_field)
+    #dtype=np.float32 solves in single precision, halving the memory traffic of each sweep (see precision_error)
+    #with diagnostics=True, a Diagnostics record is returned as well as the solution
+    #the residual is then sampled every sample_every sweeps (rounded up to whole blocks of sweeps)
+
+    if stop not in ("change", "residual"):
+        raise ValueError("Unknown stopping criterion '{0}' - expected 'change' or 'residual'.".format(stop))
+
+    info = Diagnostics("sor") if diagnostics else None
+    start = time.perf_counter() if diagnostics else None
+
+    mask = np.asarray(maskarray, dtype=np.bool_)
+    periodic = boundary == "periodic"
+    free = _free_points(mask, boundary)
+    v = _initial_field(potentialarray, initial, free, dtype)
+    start = _lap(info, "setup", start)
+
+    if f == "auto":
+        f = optimal_relaxation(mask, boundary)
+        start = _lap(info, "relaxation", start)
+    if info is not None:
+        info.omega = f
+
+    #relaxation factor to use for each colour of each sweep, passed to the kernel a block of sweeps at a time
+    #blocks are sized to roughly the same amount of work whatever the grid size, for regular callbacks
+    #(or to check_every sweeps when checking the residual) - the schedule covers up to the first 100 sweeps whatever
+    #the block size (ending sooner once it has settled on f), after which the final f is used throughout
+    block = max(1, min(100, 10**7 // v.size))
+    schedule = _relaxation_schedule(f, 100, chebyshev, tol=1e-4).astype(v.dtype)
+    if stop == "residual":
+        block = check_every
+    steady = np.full((block, 2), f, dtype=v.dtype)
+
+    #changes down at the rounding level of the dtype also count as converged, as points near 0 V can't do better
+    #rounding errors are amplified by over-relaxation, by roughly 1/(2-f) - this matters for float32,
+    #where the rounding is well above rtol times a small potential
+    floor = 2 * np.finfo(v.dtype).eps * np.abs(v).max() / max(2 - f, 1e-3)
+    threshold = atol + rtol * np.abs(v[~free]).max(initial=0)
+
+    #per-row results of the latest sweep, filled in by the kernels (allocated once, not per sweep)
+    rowchange = np.zeros(v.shape[0])
+    rowsquares = np.zeros(v.shape[0])
+    rowconverged = np.zeros(v.shape[0], dtype=np.bool_)
+
+    if active == "auto":
+        active = np.count_nonzero(free) < free.size / 2
+    cells = _active_cells(free) if active else None
+
+    def relax(omega, track):
+        if cells is None:
+            return _redblack_sweeps(v, mask, omega, rtol, floor, periodic, track, rowchange, rowconverged)
+        return _redblack_active_sweeps(v, *cells, omega, rtol, floor, periodic, track, rowchange, rowconverged)
+
+    iteration = 0
+    converged = False
+    while maxiter is None or iteration < maxiter:
+        sweeps = block if maxiter is None else min(block, maxiter - iteration)
+        omega = steady[:sweeps]
+        if iteration < len(schedule):
+            omega = np.concatenate([schedule[iteration:iteration+sweeps], omega])[:sweeps]
+
+        if stop == "change":
+            sweeps, measure, converged = relax(omega, True)
+            iteration += sweeps
+        else:
+            relax(omega, False)
+            iteration += sweeps
+            measure = _residual_norm(v, free, periodic, norm, rowchange, rowsquares)
+            converged = measure <= threshold
+
+        if info is not None and iteration >= sample_every * (len(info.residuals) + 1):
+            start = _lap(info, "sweeps", start)
+            info.residuals.append((iteration, residual(mask, v, boundary)))
+            start = _lap(info, "diagnostics", start)
+        if callback is not None and callback(iteration, measure):
+            break
+        if converged:
+            break
+
+    if info is not None:
+        _lap(info, "sweeps", start)
+        info.converged = converged
+        return v, info.finish(iteration, mask, v, boundary)
+    return v
+
+
+def optimal_relaxation(maskarray, boundary="fixed", method="power"):
+    #estimate the relaxation factor giving the fastest convergence of sor() for this mask and boundary type
+    #SOR theory gives f = 2 / (1 + sqrt(1 - rho^2)), where rho is the spectral radius of the Jacobi iteration
+    #method="grid" uses the exact rho for an empty rectangle of the same size, based on the grid dimensions alone
+    #method="power" estimates rho for the actual mask, accounting for the conductors on the canvas
+    rho = _jacobi_radius(maskarray, boundary, method)
+    return 2 / (1 + np.sqrt(1 - rho**2))
+
+
+def _jacobi_radius(maskarray, boundary, method):
+    #spectral radius of the Jacobi iteration, rho = 1 - lambda/4
+    #where lambda is the smallest eigenvalue of the (negated) Laplacian over the free points
+    import scipy.linalg
+    import scipy.sparse
+
+    ny,nx = np.shape(maskarray)
+    grid_rho = (np.cos(np.pi / (ny-1)) + np.cos(np.pi / (nx-1))) / 2
+
+    periodic = boundary == "periodic"
+    free = _free_points(maskarray, boundary)
+    if method == "grid" or free.all():
+        return grid_rho
+    if not free.any():
+        return 0.0
+
+    #the lowest mode is smooth, so is found accurately from the multigrid coarse space (Rayleigh-Ritz)
+    #then refined by a short power iteration of the Jacobi matrix on the full grid
+    A = _laplace_system(free, periodic)[0]
+    levels = _mg_levels(A, free, periodic, coarsest=500)
+
+    P = scipy.sparse.identity(A.shape[0], format="csr")
+    for level in levels[:-1]:
+        P = P @ level["P"]
+    coarse_A = levels[-1]["A"].toarray()
+    lam, x = scipy.linalg.eigh(coarse_A, (P.T @ P).toarray(), subset_by_index=[0,0])
+    x = P @ x[:,0]
+
+    for step in range(20):
+        Jx = x - (A @ x) / 4
+        rho = (x @ Jx) / (x @ x)
+        x = Jx / np.abs(Jx).max()
+
+    return rho
+
+
+def _relaxation_schedule(f, sweeps, chebyshev, tol=0.0):
+    #relaxation factor for the red and black half of each sweep
+    #Chebyshev acceleration starts from f = 1 and approaches the final (optimal) f over successive half-sweeps
+    #using the Jacobi spectral radius implied by the final f
+    #the schedule is cut short after the first sweep whose factors are both within tol of f
+    omega = np.full((sweeps, 2), float(f))
+    if chebyshev:
+        rho2 = 4 * max(f - 1, 0) / f**2
+        current = 1.0
+        for half in range(2 * sweeps):
+            omega[half // 2, half % 2] = current
+            current = 1 / (1 - rho2 / 2) if half == 0 else 1 / (1 - rho2 * current / 4)
+            if half % 2 == 1 and np.abs(omega[half // 2] - f).max() <= tol:
+                return omega[:half // 2 + 1]
+    return omega
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _relax_row(v, mask, f, rtol, floor, k, down, up, colour, periodic, track, rowchange, rowconverged):
+    #apply the 5-point stencil in place along row k, to the points of one colour
+    #if tracking, record the largest change in the row, and whether every change was within tolerance
+    nx = v.shape[1]
+    first, last = (0, nx) if periodic else (1, nx-1)
+    start = first + (k + first + colour) % 2
+
+    for l in range(start, last, 2):
+        if mask[k,l]:
+            left, right = l-1, l+1
+            if l == 0:
+                left = nx-1
+            if l == nx-1:
+                right = 0
+
+            old = v[k,l]
+            new = (1-f) * old + f/4 * (v[k,left] + v[k,right] + v[down,l] + v[up,l])
+            v[k,l] = new
+
+            if track:
+                change = abs(new - old)
+                if change > rowchange[k]:
+                    rowchange[k] = change
+                if change > rtol * abs(old) + floor:
+                    rowconverged[k] = False
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _redblack_sweeps(v, mask, omega, rtol, floor, periodic, track, rowchange, rowconverged):
+    #perform red-black SOR sweeps in place, one for each row of omega (the factors for the red and black halves)
+    #if tracking changes, stopping early once converged
+    #rows are shared between threads, each row only written by one thread and only read across colours
+    #so the result is identical whatever the number of threads
+    #returns the number of sweeps performed, the largest change in the last sweep, and whether it converged
+    ny = v.shape[0]
+    first, last = (0, ny) if periodic else (1, ny-1)
+
+    #with periodic wrap and an odd number of rows, the first and last rows neighbour each other in the same colour
+    #so the last row is held back and updated on its own after the others
+    if periodic and ny % 2 == 1:
+        last -= 1
+
+    sweeps = omega.shape[0]
+    maxchange = 0.0
+    for sweep in range(sweeps):
+        rowchange[:] = 0
+        rowconverged[:] = True
+
+        for colour in range(2):
+            f = omega[sweep, colour]
+            for k in numba.prange(first, last):
+                _relax_row(v, mask, f, rtol, floor, k, (k-1) % ny, (k+1) % ny, colour, periodic, track, rowchange, rowconverged)
+            if last < ny and periodic:
+                _relax_row(v, mask, f, rtol, floor, ny-1, ny-2, 0, colour, periodic, track, rowchange, rowconverged)
+
+        maxchange = rowchange.max()
+        if track and rowconverged.all():
+            return sweep+1, maxchange, True
+
+    return sweeps, maxchange, False
+
+
+def _active_cells(free):
+    #compressed lists of the free points, for kernels visiting only the points which can change
+    #points are grouped by colour (red-black, (k+l) % 2) then row, in increasing column order within each row
+    #returns (start, columns, left, right):
+    #the points of colour c in row k are entries start[c*ny + k] to start[c*ny + k + 1] of the other arrays,
+    #holding each point's column and the columns of its left and right neighbours (wrapping round the edges -
+    #with "fixed" boundaries the edges are never free, so the wrapped neighbours are never used)
+    #the rows above and below are found from the row, so with the columns these give all 4 neighbours
+    ny, nx = free.shape
+    rows, columns = np.nonzero(free)
+    colour = (rows + columns) % 2
+    order = np.argsort(colour, kind="stable")
+    rows, columns, colour = rows[order], columns[order], colour[order]
+
+    start = np.zeros(2*ny + 1, dtype=np.int64)
+    start[1:] = np.cumsum(np.bincount(colour*ny + rows, minlength=2*ny))
+    return (start, columns.astype(np.int32), ((columns - 1) % nx).astype(np.int32),
+            ((columns + 1) % nx).astype(np.int32))
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _relax_cells(v, columns, left, right, begin, end, f, rtol, floor, k, down, up, track, rowchange, rowconverged):
+    #as _relax_row, but for the listed free points begin to end of one colour in row k
+    for i in range(begin, end):
+        l = columns[i]
+        old = v[k,l]
+        new = (1-f) * old + f/4 * (v[k,left[i]] + v[k,right[i]] + v[down,l] + v[up,l])
+        v[k,l] = new
+
+        if track:
+            change = abs(new - old)
+            if change > rowchange[k]:
+                rowchange[k] = change
+            if change > rtol * abs(old) + floor:
+                rowconverged[k] = False
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _redblack_active_sweeps(v, start, columns, left, right, omega, rtol, floor, periodic, track, rowchange, rowconverged):
+    #as _redblack_sweeps, visiting only the free points listed by _active_cells - the points are updated in
+    #the same order, so the result is identical
+    ny = v.shape[0]
+    last = ny - 1 if periodic and ny % 2 == 1 else ny
+
+    sweeps = omega.shape[0]
+    maxchange = 0.0
+    for sweep in range(sweeps):
+        rowchange[:] = 0
+        rowconverged[:] = True
+
+        for colour in range(2):
+            f = omega[sweep, colour]
+            for k in numba.prange(last):
+                row = colour*ny + k
+                _relax_cells(v, columns, left, right, start[row], start[row+1], f, rtol, floor, k, (k-1) % ny, (k+1) % ny,
+                             track, rowchange, rowconverged)
+            if last < ny:
+                row = colour*ny + ny-1
+                _relax_cells(v, columns, left, right, start[row], start[row+1], f, rtol, floor, ny-1, ny-2, 0,
+                             track, rowchange, rowconverged)
+
+        maxchange = rowchange.max()
+        if track and rowconverged.all():
+            return sweep+1, maxchange, True
+
+    return sweeps, maxchange, False
+
+
+def _residual_norm(v, free, periodic, norm, rowmax, rowsquares):
+    #residual of Laplace's equation over the free points (see residual()), using preallocated per-row buffers
+    _residual_rows(v, free, periodic, rowmax, rowsquares)
+    if norm == "inf":
+        return rowmax.max()
+    elif norm == "2":
+        return np.sqrt(rowsquares.sum() / max(np.count_nonzero(free), 1))
+    raise ValueError("Unknown norm '{0}' - expected 'inf' or '2'.".format(norm))
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _residual_rows(v, free, periodic, rowmax, rowsquares):
+    #largest and sum of squared residuals along each row - the difference between each free point and the average
+    #of its 4 neighbours, wrapping round the edges (with fixed boundaries, edge points are never free)
+    #a single read-only pass over the grid, with no temporary arrays
+    ny, nx = v.shape
+    for k in numba.prange(ny):
+        down, up = (k-1) % ny, (k+1) % ny
+        largest, squares = 0.0, 0.0
+        for l in range(nx):
+            if free[k,l]:
+                left = l-1 if l > 0 else nx-1
+                right = l+1 if l < nx-1 else 0
+                r = (v[k,left] + v[k,right] + v[down,l] + v[up,l]) / 4 - v[k,l]
+                squares += r * r
+                if abs(r) > largest or r != r:  # - a NaN residual is kept (later values never compare greater)
+                    largest = abs(r)
+        rowmax[k] = largest
+        rowsquares[k] = squares
+
+
+def multigrid(maskarray, potentialarray, rtol=1e-4, boundary="fixed", maxiter=100, callback=None, initial=None, diagnostics=False):
+    #geometric multigrid solver, as an alternative engine to sor() taking the same inputs
+    #the free (editable) points form a sparse linear system, with the fixed potentials moved into the right-hand side
+    #a hierarchy of coarser grids is built by bilinear interpolation, with coarse operators formed from the fine ones
+    #(Galerkin coarsening) - so conductors of any shape, even 1 pixel wide, are represented properly on every level
+    #a "full multigrid" pass gives the initial guess: solve on the coarsest grid, interpolate up, V-cycle each level
+    #then V-cycles are used as the preconditioner for conjugate gradient iterations on the finest grid
+    #work per iteration is linear in the number of points, and the iteration count does not grow with grid size
+    #stops once the largest change in an iteration falls below rtol, relative to the largest potential
+    #callback(iteration, maxchange) is called after every iteration - returning True stops the solve early
+    #an "initial" guess for the editable points replaces the full multigrid pass (see _initial_field)
+    #with diagnostics=True, a Diagnostics record is returned as well as the solution (residual after every iteration)
+
+    info = Diagnostics("multigrid") if diagnostics else None
+    start = time.perf_counter() if diagnostics else None
+
+    periodic = boundary == "periodic"
+    free = _free_points(maskarray, boundary)
+    v = _initial_field(potentialarray, initial, free)
+    iterations, converged = 0, True
+
+    if free.all():
+        #no fixed points anywhere (only possible with periodic wrap) - any constant is a solution
+        v[:] = v.mean()
+    elif free.any():
+        A, C = _laplace_system(free, periodic)
+        b = C @ v[~free]
+        start = _lap(info, "setup", start)
+        levels = _mg_levels(A, free, periodic)
+        start = _lap(info, "hierarchy", start)
+
+        x = _mg_full_cycle(levels, b) if initial is None else v[free]
+        start = _lap(info, "full_cycle", start)
+        history = None if info is None else info.residuals
+        x, iterations, converged = _mg_pcg(levels, b, x, rtol * np.abs(v).max(), maxiter, callback, history)
+        start = _lap(info, "iterations", start)
+        v[free] = x
+
+    if info is not None:
+        info.converged = converged
+        return v, info.finish(iterations, maskarray, v, boundary)
+    return v
+
+
+def sparse_direct(maskarray, potentialarray, rtol=1e-4, boundary="fixed"):
+    #direct solve of the sparse linear system for the free points, taking the same inputs as sor()
+    #(rtol is accepted for compatibility, but unused - the solution is exact up to rounding)
+    #the 5-point Laplacian over the free points is factorized once and cached, keyed on the mask and boundary type
+    #so re-solving the same conductor layout with different potentials is only a back-substitution
+
+    v = np.array(potentialarray, dtype=np.float64)
+    free, lu, C = _factorization(maskarray, boundary)
+
+    if lu is None:
+        if free.all():
+            #no fixed points anywhere (only possible with periodic wrap) - any constant is a solution
+            v[:] = v.mean()
+        return v
+
+    v[free] = lu.solve(C @ v[~free])
+    return v
+
+
+#most recently used factorizations for sparse_direct(), oldest first
+_factorizations = collections.OrderedDict()
+_factorizations_kept = 4
+
+
+def _factorization(maskarray, boundary):
+    #look up (or compute and store) the factorized system for this mask and boundary type
+    #returns the free points, the LU factorization (None if there is nothing to solve), and the coupling matrix
+    import scipy.sparse.linalg
+
+    free = _free_points(maskarray, boundary)
+    key = (hashlib.sha1(np.packbits(free)).hexdigest(), free.shape, boundary)
+
+    if key in _factorizations:
+        _factorizations.move_to_end(key)
+        return _factorizations[key]
+
+    if free.any() and not free.all():
+        A, C = _laplace_system(free, boundary == "periodic")
+        #minimum degree ordering on the symmetric structure keeps the fill-in of the factors low
+        lu = scipy.sparse.linalg.splu(A.tocsc(), permc_spec="MMD_AT_PLUS_A", options={"SymmetricMode":True})
+    else:
+        lu, C = None, None
+
+    _factorizations[key] = free, lu, C
+    while len(_factorizations) > _factorizations_kept:
+        _factorizations.popitem(last=False)
+    return _factorizations[key]
+
+
+def spectral(maskarray, potentialarray, rtol=1e-4, boundary="periodic", maxiter=500, callback=None, diagnostics=False):
+    #FFT-based solver, as an alternative engine to sor() taking the same inputs
+    #on a periodic grid the 5-point Laplacian is diagonalised by the 2D FFT, so the potential of any set of point
+    #charges q over the whole grid takes one forward and one inverse FFT: v = G q, with G the periodic Green's function
+    #the fixed points are handled by the capacitance matrix method: charges are placed on the "surface" of the fixed
+    #points (those next to a free point), chosen so that G q + c takes the fixed potentials there - every free point
+    #then satisfies Laplace's equation, as its 4 neighbours are free or surface points with the right potentials
+    #(the charges must sum to zero for a periodic solution to exist, and c is the constant this leaves undetermined)
+    #the charges are found by conjugate gradients on the capacitance matrix -G between surface points, applied with
+    #a pair of FFTs per iteration and never formed, preconditioned by the Laplacian among the surface points
+    #(roughly its inverse) - so a solve takes a few dozen FFTs, however slowly sor would converge
+    #with "fixed" boundaries the edges of the grid simply join the fixed points, so the wrap-around never matters
+    #stops once the potential at every surface point is within rtol of the largest fixed potential - by the maximum
+    #principle, the error at every free point is then within this too
+    #callback(iteration, error) is called after every iteration with the largest surface potential error
+    #- returning True stops the solve early
+    #with diagnostics=True, a Diagnostics record is returned as well as the solution
+    import scipy.fft
 
-    v_q_plus = potentialarray.copy()
-    ny,nx = v_q_plus.shape
+    info = Diagnostics("spectral") if diagnostics else None
+    start = time.perf_counter() if diagnostics else None
+
+    free = _free_points(maskarray, boundary)
+    v = np.array(potentialarray, dtype=np.float64)
+    iterations, converged = 0, True
+
+    if free.all():
+        #no fixed points anywhere (only possible with periodic wrap) - any constant is a solution
+        v[:] = v.mean()
+    elif free.any():
+        surface = _surface_points(free)
+        green = _green_spectrum(free.shape)
+        grid = np.zeros(free.shape)
+        workers = numba.get_num_threads()
+
+        def potential(q):
+            #potential over the whole grid of charges q on the surface points
+            grid.ravel()[surface] = q
+            return scipy.fft.irfft2(scipy.fft.rfft2(grid, workers=workers) * green, s=free.shape, workers=workers)
+
+        def capacitance(q):
+            #-G between surface points, for charges summing to zero, projected to zero mean
+            u = -potential(q).ravel()[surface]
+            return u - u.mean()
+
+        fixed = v.ravel()[surface]
+        start = _lap(info, "setup", start)
+        q, iterations, converged = _surface_pcg(capacitance, _surface_laplacian(free, surface), fixed.mean() - fixed,
+                                                rtol * np.abs(fixed).max(), maxiter, callback)
+        start = _lap(info, "iterations", start)
+
+        u = potential(q)
+        u += np.mean(fixed - u.ravel()[surface])
+        v[free] = u[free]
+        start = _lap(info, "field", start)
+
+    if info is not None:
+        info.converged = converged
+        return v, info.finish(iterations, maskarray, v, boundary)
+    return v
+
+
+def _surface_points(free):
+    #flattened indices of the fixed points with a free neighbour (wrapping round the edges of the grid)
+    near = np.zeros_like(free)
+    for axis in (0, 1):
+        for shift in (1, -1):
+            near |= np.roll(free, shift, axis=axis)
+    return np.flatnonzero(~free & near)
+
+
+def _green_spectrum(shape):
+    #Fourier transform (as laid out by rfft2) of the periodic Green's function of the 5-point Laplacian
+    #the inverse of its eigenvalues 2cos(2πk/ny) + 2cos(2πl/nx) - 4, with the constant mode (eigenvalue 0) left out
+    ny, nx = shape
+    eigenvalues = (2*np.cos(2*np.pi*np.fft.fftfreq(ny))[:,None] + 2*np.cos(2*np.pi*np.fft.rfftfreq(nx))[None,:] - 4)
+    eigenvalues[0,0] = 1
+    green = 1 / eigenvalues
+    green[0,0] = 0
+    return green
+
+
+def _surface_laplacian(free, surface):
+    #sparse (negated) 5-point Laplacian between the surface points only - 4 on the diagonal, -1 for each surface neighbour
+    #every surface point has a free neighbour, so this is strictly diagonally dominant (positive definite)
+    import scipy.sparse
+
+    ny, nx = free.shape
+    index = np.full(free.size, -1)
+    index[surface] = np.arange(len(surface))
+    k, l = np.divmod(surface, nx)
+    rows, cols = [np.arange(len(surface))], [np.arange(len(surface))]
+    values = [4*np.ones(len(surface))]
+    for dk, dl in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        neighbour = index[((k + dk) % ny) * nx + (l + dl) % nx]
+        found = neighbour >= 0
+        rows.append(np.flatnonzero(found))
+        cols.append(neighbour[found])
+        values.append(-np.ones(found.sum()))
+    return scipy.sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                                   shape=(len(surface), len(surface)))
+
+
+def _surface_pcg(K, M, b, atol, maxiter, callback=None):
+    #conjugate gradient for the surface charges, solving K q = b among charges summing to zero
+    #(K a function applying the projected capacitance matrix, M the preconditioner, b of zero mean)
+    #the residual is the error in the surface potentials, so it stops once its largest value is at most atol
+    #returns the charges, the number of iterations, and whether it converged
+    def precondition(r):
+        z = M @ r
+        return z - z.mean()
+
+    q = np.zeros(len(b))
+    r = b.copy()
+    z = precondition(r)
+    p = z.copy()
+    rz = r @ z
+
+    converged = np.abs(r).max() <= atol
+    iteration = 0
+    while not converged and iteration < maxiter:
+        Kp = K(p)
+        alpha = rz / (p @ Kp)
+        q += alpha * p
+        r -= alpha * Kp
+        iteration += 1
+        error = np.abs(r).max()
+        if callback is not None and callback(iteration, error):
+            break
+        if error <= atol:
+            converged = True
+            break
+
+        z = precondition(r)
+        rz, rz_old = r @ z, rz
+        p = z + (rz / rz_old) * p
+
+    return q, iteration, converged
+
+
+def _initial_field(potentialarray, initial, free, dtype=np.float64):
+    #starting array for an iterative solve: the fixed potentials everywhere, with the free points taken from
+    #the initial guess if one is given - warm-starting from a previous solution converges in far fewer iterations
+    #when only part of the canvas has changed
+    v = np.array(potentialarray, dtype=dtype)
+    if initial is not None:
+        np.copyto(v, initial, where=free)
+    return v
+
+
+def _free_points(maskarray, boundary):
+    #boolean array of the points which are allowed to change
+    #with "fixed" boundaries the edges of the grid are never updated, so are treated as fixed points
+    free = np.asarray(maskarray, dtype=bool)
+    if boundary != "periodic":
+        free = free.copy()
+        free[[0,-1],:] = False
+        free[:,[0,-1]] = False
+    return free
+
+
+def _grid_laplacian(shape, periodic):
+    #sparse 5-point Laplacian over every point of the grid, in row-major (flattened) order
+    #built from the 1D second difference along each axis, wrapping round for "periodic"
+    import scipy.sparse
+
+    def second_difference(n):
+        D = scipy.sparse.diags([np.ones(n-1), -2*np.ones(n), np.ones(n-1)], [-1,0,1], format="lil")
+        if periodic:
+            D[0,-1] += 1
+            D[-1,0] += 1
+        return D.tocsr()
+
+    ny,nx = shape
+    return (scipy.sparse.kron(second_difference(ny), scipy.sparse.identity(nx))
+            + scipy.sparse.kron(scipy.sparse.identity(ny), second_difference(nx))).tocsr()
+
+
+def _laplace_system(free, periodic):
+    #linear system A x = C v for the potentials x at the free points, given potentials v at the fixed points
+    #A is the (negated, so positive definite) Laplacian between free points
+    #C couples each free point to its fixed neighbours
+    L = _grid_laplacian(free.shape, periodic)[free.ravel()]
+    A = -L[:, free.ravel()]
+    C = L[:, ~free.ravel()]
+    return A.tocsr(), C.tocsr()
+
+
+def _mg_interpolation(n, periodic):
+    #1D linear interpolation matrix from a coarse line of points onto n fine points
+    #coarse points sit on every other fine point - odd fine points take the average of the coarse points either side
+    #with "fixed" edges and an even number of points, the last coarse point sits one beyond the grid (dropped later)
+    #with "periodic" wrap the last fine point may instead lie between the last and first coarse points
+    import scipy.sparse
+
+    coarse_at = np.arange(0, n if periodic else n+1, 2)
+    m = coarse_at.size
+
+    between = np.setdiff1d(np.arange(n), coarse_at)
+    lower = np.searchsorted(coarse_at, between) - 1
+    rows = np.concatenate([coarse_at, between, between])
+    cols = np.concatenate([np.arange(m), lower, (lower + 1) % m])
+    vals = np.concatenate([np.ones(m), np.full(2*between.size, 0.5)])
+
+    inside = rows < n
+    return scipy.sparse.coo_matrix((vals[inside], (rows[inside], cols[inside])), shape=(n,m)).tocsr()
+
+
+def _mg_levels(A, free, periodic, coarsest=2000):
+    #build the hierarchy of grids, from the original down to one small enough to solve directly
+    #each level stores its operator, the inverse diagonal for smoothing, and interpolation from the level below
+    #"active" marks which points of each grid carry an unknown
+    import scipy.sparse
+    import scipy.sparse.linalg
+
+    levels = []
+    active = free
     while True:
-        v_q = v_q_plus.copy()
+        level = {"A":A, "Dinv":1 / A.diagonal()}
+        levels.append(level)
+
+        ny,nx = active.shape
+        if A.shape[0] <= coarsest or min(ny,nx) <= 3:
+            level["solve"] = scipy.sparse.linalg.splu(A.tocsc())
+            break
+
+        #coarse points are kept only where they sit on an active fine point - each kept column of P then has its own
+        #unit entry, so the columns are independent and the coarse operator stays non-singular
+        #(coarse points only touching active points from outside could otherwise duplicate each other's columns)
+        used = np.zeros(((ny+1)//2 if periodic else ny//2+1, (nx+1)//2 if periodic else nx//2+1), dtype=bool)
+        used[:(ny+1)//2, :(nx+1)//2] = active[::2, ::2]
 
-        if boundary == "periodic":
-            for k in numba.prange(ny):
-                #set edge cases manually to wrap-around to other side of array ("periodic" boundary conditions)
-                up, down = k+1, k-1  # - standard values for interior points
-                if k == 0:
-                    up, down = -1, 1
-                if k == ny-1:
-                    up, down = -2, 0
+        P = scipy.sparse.kron(_mg_interpolation(ny, periodic), _mg_interpolation(nx, periodic), format="csr")
+        P = P[active.ravel()][:, used.ravel()].tocsr()
 
-                for l in numba.prange(nx):
-                    left, right = l-1, l+1
-                    if l == 0:
-                        left, right = -1, 1
-                    if l == nx-1:
-                        left, right = -2, 0
+        level["P"] = P
+        A = (P.T @ A @ P).tocsr()
+        active = used
 
+    return levels
 
-                    #apply the 5-point stencil
-                    if maskarray[k,l] == True:
-                        v_q_plus[k,l] = (1-f) * v_q_plus[k,l] \
-                                        + f/4 * (v_q_plus[k,left] + v_q_plus[k,right] + v_q_plus[down,l] + v_q_plus[up,l])
 
+def _mg_vcycle(levels, depth, r, sweeps=2, weight=2/3):
+    #approximate solution of A x = r on this level: weighted Jacobi smoothing either side of a coarse correction
+    #symmetric (same smoothing before and after), so it can be used as a conjugate gradient preconditioner
+    level = levels[depth]
+    if "solve" in level:
+        return level["solve"].solve(r)
 
-        elif boundary == "fixed":
-            #avoid any modification of edge points, process available points without using "ghost" points
-            for k in numba.prange(1,ny-1):
-                for l in numba.prange(1,nx-1):
-                    if maskarray[k,l] == True:
-                        up, down = k+1, k-1
-                        left, right = l+1, l-1
+    A, Dinv, P = level["A"], level["Dinv"], level["P"]
+    x = weight * Dinv * r
+    for sweep in range(sweeps-1):
+        x += weight * Dinv * (r - A @ x)
 
+    x += P @ _mg_vcycle(levels, depth+1, P.T @ (r - A @ x), sweeps, weight)
 
-                        #apply the 5-point stencil
-                        v_q_plus[k,l] = (1-f) * v_q_plus[k,l] \
-                                        + f/4 * (v_q_plus[k,left] + v_q_plus[k,right] + v_q_plus[down,l] + v_q_plus[up,l])
+    for sweep in range(sweeps):
+        x += weight * Dinv * (r - A @ x)
+    return x
 
 
+def _mg_full_cycle(levels, b):
+    #full multigrid: restrict the right-hand side down to the coarsest grid and solve it exactly
+    #then interpolate the solution up a level at a time, improving it with one V-cycle on each level
+    rhs = [b]
+    for level in levels[:-1]:
+        rhs.append(level["P"].T @ rhs[-1])
 
-        #explicit implementation of np.allclose, which seems not to be usable by numba.jit
-        #check relative change by all points - if all are below the tolerance level: finish
-        if np.less_equal(np.abs(v_q_plus - v_q), rtol * np.abs(v_q)).all():
+    x = levels[-1]["solve"].solve(rhs[-1])
+    for depth in range(len(levels)-2, -1, -1):
+        x = levels[depth]["P"] @ x
+        x += _mg_vcycle(levels, depth, rhs[depth] - levels[depth]["A"] @ x)
+    return x
+
+
+def _mg_pcg(levels, b, x, atol, maxiter, callback=None, history=None):
+    #conjugate gradient on the finest level, preconditioned by one V-cycle per iteration
+    #stops once the largest change to any point in an iteration is at most atol
+    #returns the solution, the number of iterations, and whether it converged
+    #if a history list is given, (iteration, residual) pairs are added to it - A has 4 on the diagonal, so the
+    #largest residual of A x = b over 4 is the residual() of the solution
+    A = levels[0]["A"]
+    r = b - A @ x
+    z = _mg_vcycle(levels, 0, r)
+    p = z.copy()
+    rz = r @ z
+
+    #nothing to do if the starting guess is already exact - e.g. every conductor at 0 V with a zero guess
+    #(the first step would otherwise be 0/0)
+    if not r.any():
+        return x, 0, True
+
+    iterations, converged = 0, False
+    while iterations < maxiter:
+        Ap = A @ p
+        pAp = p @ Ap
+        if pAp == 0:  # - no search direction left, so the residual is already zero
+            converged = True
+            break
+        iterations += 1
+
+        alpha = rz / pAp
+        x += alpha * p
+        r -= alpha * Ap
+        change = abs(alpha) * np.abs(p).max()
+        if history is not None:
+            history.append((iterations, np.abs(r).max() / 4))
+        if callback is not None and callback(iterations, change):
             break
+        if change <= atol:
+            converged = True
+            break
+
+        z = _mg_vcycle(levels, 0, r)
+        rz, rz_old = r @ z, rz
+        p = z + (rz / rz_old) * p
+
+    return x, iterations, converged
+
+
+class Diagnostics():
+
+    """Record of how a solve went, returned alongside the solution by the solvers when diagnostics=True.
+    - engine: name of the solver used
+    - iterations: number of iterations (sweeps for sor) performed
+    - converged: whether the stopping tolerance was reached (False if stopped early by the callback)
+    - residuals: list of (iteration, residual) samples taken during the solve, ending with the final residual
+      (the largest difference between a free point and the average of its neighbours, see residual())
+    - times: wall time in seconds spent in each phase of the solve, e.g. "setup", "sweeps", "diagnostics"
+    - omega: the relaxation factor used by sor (None for other engines)
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.iterations = 0
+        self.converged = False
+        self.residuals = []
+        self.times = {}
+        self.omega = None
+        return
+
+
+    def finish(self, iterations, maskarray, potentials, boundary="fixed"):
+        #record the final iteration count and residual, once the solve is complete
+        self.iterations = iterations
+        start = time.perf_counter()
+        self.residuals.append((iterations, residual(maskarray, potentials, boundary)))
+        _lap(self, "diagnostics", start)
+        return self
+
+
+    def __repr__(self):
+        return ("Diagnostics({0}: {1} iterations, converged={2}, final residual {3:.3g} V, {4:.3f} s)"
+                .format(self.engine, self.iterations, self.converged, self.residuals[-1][1], sum(self.times.values())))
+
+
+def _lap(info, phase, start):
+    #add the time since start to a phase of the diagnostics, returning the new start time
+    #does nothing (returning None) when no diagnostics are being kept
+    if info is None:
+        return None
+    now = time.perf_counter()
+    info.times[phase] = info.times.get(phase, 0.0) + now - start
+    return now
+
+
+#solver engines sharing the call signature (maskarray, potentialarray, rtol=..., boundary=..., **options)
+ENGINES = {"sor":sor, "multigrid":multigrid, "sparse_direct":sparse_direct, "spectral":spectral, "jacobi":finite_difference}
+
 
-    return v_q_plus.copy()
+def residual(maskarray, potentials, boundary="fixed", norm="inf"):
+    #how far a solution is from satisfying Laplace's equation: the difference between each free point
+    #and the average of its 4 neighbours (in volts), over the points allowed to change
+    #norm="inf" gives the largest difference, norm="2" the root mean square
+    free = _free_points(maskarray, boundary)
+    v = np.ascontiguousarray(potentials)
+    return float(_residual_norm(v, free, boundary == "periodic", norm, np.zeros(v.shape[0]), np.zeros(v.shape[0])))
 
 
-def get_Efield(final_potentials):
+def precision_error(maskarray, potentialarray, engine="sor", boundary="fixed", dtype=np.float32, **options):
+    #accuracy check of a reduced precision solve against the same solve in double precision
+    #returns the largest difference in potential and in field strength, each relative to the largest double precision value
+    #measured with rtol=1e-4 on the 600x500 parallel plates and cylinder scene (sor with f="auto", chebyshev=True):
+    #float32 agrees with float64 to 1.4e-4 (fixed) / 2.7e-4 (periodic) in potential and 3e-4 / 4.2e-4 in field strength
+    #- about the solver tolerance itself, so float32 suits previews and large grids rather than precise results
+    #(float64 agrees with the exact sparse_direct solution to about 1e-7 on the same scene)
+    #only the engines that take a dtype (sor and jacobi) can solve in reduced precision
+    if engine in ENGINES and engine not in ("sor", "jacobi"):
+        raise ValueError("The '{0}' engine always solves in double precision - precision_error needs 'sor' or 'jacobi'.".format(engine))
+    single = solve(maskarray, potentialarray, engine, boundary=boundary, dtype=dtype, **options)
+    double = solve(maskarray, potentialarray, engine, boundary=boundary, dtype=np.float64, **options)
+
+    field_single = field_arrays(single, boundary)[2]
+    field_double = field_arrays(double, boundary)[2]
+    return (np.abs(single - double).max() / np.abs(double).max(),
+            np.abs(field_single - field_double).max() / field_double.max())
+
+
+def solve(maskarray, potentialarray, engine="sor", rtol=1e-4, boundary="fixed", **options):
+    #run one of the solver engines by name - any extra options are passed on to it (e.g. f="auto" for sor)
+    if engine not in ENGINES:
+        raise ValueError("Unknown solver engine '{0}' - expected one of {1}.".format(engine, list(ENGINES)))
+    return ENGINES[engine](maskarray, potentialarray, rtol=rtol, boundary=boundary, **options)
+
+
+def coarsen(maskarray, potentialarray, factor):
+    #a downsampled copy of a problem, for a quick preview of its solution (or a starting guess for the full grid)
+    #each factor x factor block of points becomes one point - fixed if any point in the block is fixed, so thin
+    #conductors aren't lost, and at the mean potential of the block's fixed points
+    #the grid is extended by repeating its last row and column when its size isn't a multiple of the factor
+    ny, nx = np.shape(maskarray)
+    cy, cx = -(-ny // factor), -(-nx // factor)
+    padding = ((0, cy*factor - ny), (0, cx*factor - nx))
+    fixed = np.pad(~np.asarray(maskarray, dtype=bool), padding, mode="edge").reshape(cy, factor, cx, factor)
+    potentials = np.pad(np.asarray(potentialarray, dtype=float), padding, mode="edge").reshape(cy, factor, cx, factor)
+
+    count = fixed.sum(axis=(1,3))
+    total = np.where(fixed, potentials, 0.0).sum(axis=(1,3))
+    return count == 0, total / np.maximum(count, 1)
+
+
+def refine(coarse, factor, shape):
+    #spread each point of a coarsened array back over its block, cut to the original grid's shape
+    ny, nx = shape
+    return np.repeat(np.repeat(coarse, factor, axis=0), factor, axis=1)[:ny, :nx]
+
+
+def warm_up(background=True):
+    #compile the numba kernels (or load them from the on-disk cache) and import scipy, by solving a tiny grid
+    #the same way the GUI does - so the first real solve starts straight away
+    #with background=True this runs on a daemon thread, which is returned (join it before solving on another thread,
+    #as numba's parallel kernels shouldn't be launched from two threads at once), otherwise it runs now
+    if background:
+        thread = threading.Thread(target=warm_up, args=(False,), daemon=True)
+        thread.start()
+        return thread
+
+    maskarray = np.ones((8, 8), dtype=bool)
+    maskarray[3:5, 3:5] = False
+    potentialarray = np.where(maskarray, 0.0, 1.0)
+    v = sor(maskarray, potentialarray, f="auto", boundary="periodic", chebyshev=True)
+    sor(maskarray, potentialarray, f="auto", boundary="periodic", chebyshev=True, active=True)
+    spectral(maskarray, potentialarray, boundary="periodic")
+    residual(maskarray, v, "periodic")
+    field_arrays(v, "periodic")
+    return None
+
+
+def get_Efield(final_potentials, dtype=None, boundary="fixed"):
     #having processed for the numerical values of potential across the grid
     #now interested in getting the electric field shape, E = - grad(V)
+    #the field has the precision of the potentials, unless another dtype is given (e.g. np.float32 to halve its size)
+    #with boundary="periodic" the gradient wraps round the edges of the grid, as the solution does
+    #otherwise one-sided differences are taken at the edges (as np.gradient) - see field_arrays
+
+    Ex, Ey, E_mod = field_arrays(final_potentials, boundary, dtype=dtype)
+    Efield = [Ex, Ey]
+
+    return Efield
+
+
+def field_arrays(final_potentials, boundary="fixed", energy=False, dtype=None, out=None):
+    #electric field E = - grad(V), its magnitude |E| and (if energy=True) the energy density ε0|E|²/2,
+    #all from a single compiled pass over the potentials - returns (Ex, Ey, E_mod) or (Ex, Ey, E_mod, energy_density)
+    #gradients are central differences, wrapping round the edges with boundary="periodic",
+    #otherwise one-sided at the edges - exactly as np.gradient
+    #(E is in volts per grid spacing, so the energy density is in J/m³ for a grid spacing of 1 m)
+    #out can give preallocated arrays to fill, in the same order as returned, of the shape and dtype of the potentials
+    import scipy.constants
+
+    v = np.asarray(final_potentials, dtype=dtype)
+    if not np.issubdtype(v.dtype, np.floating):
+        v = v.astype(np.float64)
+    if min(v.shape) < 2:
+        raise ValueError("Potentials of shape {0} are too small for a gradient - at least 2 points are needed along each axis.".format(v.shape))
+
+    count = 4 if energy else 3
+    if out is None:
+        out = tuple(np.empty_like(v) for i in range(count))
+    #without energy, the kernel is given the magnitude array to write to twice rather than a dummy array
+    _field_kernel(v, boundary == "periodic", out[0], out[1], out[2], out[3] if energy else out[2], energy, scipy.constants.epsilon_0)
+    return tuple(out[:count])
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _field_kernel(v, periodic, Ex, Ey, E_mod, energy_density, energy, epsilon_0):
+    #one pass over the grid, each row in parallel - every output written once, with no temporary arrays
+    ny, nx = v.shape
+    for k in numba.prange(ny):
+        for l in range(nx):
+            if 0 < l < nx-1:
+                gx = (v[k,l+1] - v[k,l-1]) / 2
+            elif periodic:
+                gx = (v[k,(l+1) % nx] - v[k,(l-1) % nx]) / 2
+            elif l == 0:
+                gx = v[k,1] - v[k,0]
+            else:
+                gx = v[k,nx-1] - v[k,nx-2]
 
-    gradV = np.gradient(final_potentials, axis=(1,0))
-    Efield = [-gradV[0], -gradV[1]]
+            if 0 < k < ny-1:
+                gy = (v[k+1,l] - v[k-1,l]) / 2
+            elif periodic:
+                gy = (v[(k+1) % ny,l] - v[(k-1) % ny,l]) / 2
+            elif k == 0:
+                gy = v[1,l] - v[0,l]
+            else:
+                gy = v[ny-1,l] - v[ny-2,l]
 
-    return Efield
\ No newline at end of file
+            Ex[k,l] = -gx
+            Ey[k,l] = -gy
+            squared = gx*gx + gy*gy
+            E_mod[k,l] = np.sqrt(squared)
+            if energy:
+                energy_density[k,l] = 0.5 * epsilon_0 * squared
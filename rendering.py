@@ -0,0 +1,112 @@
+"""Drawing the electric field onto matplotlib axes, in one of several styles, fast enough to redraw at will.
+- "streamlines": field lines as traced by matplotlib's streamplot - tracing takes seconds on a large grid (often longer
+  than the solve), so the lines are traced once per solution and kept, after which drawing them takes milliseconds
+- "quiver": arrows of the field's direction on a decimated grid, about every `spacing` points
+- "lic": a line integral convolution texture - random noise smeared out along the field lines, worked out with
+  whole-array NumPy operations
+Whatever a style works out is kept in a cache, a plain dictionary stored alongside the solution, e.g.
+    cache = {}
+    draw_field(ax, Ex, Ey, "streamlines", cache)  # - traces the lines
+    draw_field(ax2, Ex, Ey, "streamlines", cache)  # - only draws them
+A cache belongs to one field on one grid - start a new dictionary whenever the field changes.
+"""
+import numpy as np
+
+
+STYLES = ("streamlines", "quiver", "lic")
+
+
+def prepare_field(Ex, Ey, style="streamlines", cache=None, x=None, y=None, **options):
+    #work out what drawing the field in a style needs, without drawing it (e.g. on a worker thread after a solve)
+    #x and y are the coordinates of the grid's columns and rows (by default their indices), and the options are passed
+    #on to the style's function below - the result is stored in cache (if given) and reused from there next time
+    if style not in STYLES:
+        raise ValueError("Unknown field style '{0}' - expected one of {1}.".format(style, list(STYLES)))
+    key = (style,) + tuple(sorted(options.items()))
+    if cache is not None and key in cache:
+        return cache[key]
+
+    x = np.arange(np.shape(Ex)[1]) if x is None else x
+    y = np.arange(np.shape(Ex)[0]) if y is None else y
+    if style == "streamlines":
+        shapes = trace_streamlines(Ex, Ey, x, y, **options)
+    elif style == "quiver":
+        shapes = quiver_arrows(Ex, Ey, x, y, **options)
+    else:
+        shapes = lic_texture(Ex, Ey, x, y, **options)
+
+    if cache is not None:
+        cache[key] = shapes
+    return shapes
+
+
+def draw_field(ax, Ex, Ey, style="streamlines", cache=None, x=None, y=None, **options):
+    #draw the field on ax in the given style, over whatever is there already (see prepare_field for the arguments)
+    from matplotlib.collections import LineCollection
+    from matplotlib.patches import FancyArrowPatch
+
+    shapes = prepare_field(Ex, Ey, style, cache, x, y, **options)
+    if style == "streamlines":
+        #as ax.streamplot(x, y, Ex, Ey, linewidth=0.5) draws them
+        ax.add_collection(LineCollection(shapes["segments"], linewidths=0.5, colors="C0"), autolim=False)
+        for tail, head in shapes["arrows"]:
+            ax.add_artist(FancyArrowPatch(tail, head, arrowstyle="-|>", mutation_scale=10, linewidth=0.5, color="C0"))
+    elif style == "quiver":
+        ax.quiver(*shapes, angles="xy", pivot="mid", width=0.002)
+    else:
+        texture, extent = shapes
+        ax.imshow(texture, cmap="gray", alpha=0.6, extent=extent, interpolation="nearest")
+    return
+
+
+def trace_streamlines(Ex, Ey, x, y, density=1.5):
+    #field lines as matplotlib's streamplot traces them - traced on an axes of their own, which is thrown away
+    #returns the lines as arrays of points, and the (tail, head) of an arrow half-way along each, as streamplot places them
+    from matplotlib.figure import Figure
+
+    lines = Figure().add_subplot().streamplot(x, y, Ex, Ey, density=density).lines
+    segments = lines.get_segments()
+    arrows = []
+    for points in segments:
+        distance = np.cumsum(np.hypot(*np.diff(points, axis=0).T))
+        i = np.searchsorted(distance, distance[-1] / 2)
+        arrows.append((tuple(points[i]), tuple(points[i:i+2].mean(axis=0))))
+    return {"segments":segments, "arrows":arrows}
+
+
+def quiver_arrows(Ex, Ey, x, y, spacing=16):
+    #unit arrows of the field's direction about every "spacing" units of x and y - the arguments of ax.quiver
+    step = max(1, int(round(spacing / (x[1] - x[0])))) if len(x) > 1 else 1
+    Ex, Ey = Ex[::step, ::step], Ey[::step, ::step]
+    E_mod = np.hypot(Ex, Ey)
+    E_mod[E_mod == 0] = 1
+    return np.asarray(x)[::step], np.asarray(y)[::step], Ex / E_mod, Ey / E_mod
+
+
+def lic_texture(Ex, Ey, x, y, length=15, seed=0):
+    #line integral convolution: the average of a white noise image along the field line through each point,
+    #followed "length" unit steps forwards and backwards - every point is stepped along at once
+    #returns the texture and its extent for ax.imshow (points with no field are left blank)
+    ny, nx = np.shape(Ex)
+    E_mod = np.hypot(Ex, Ey)
+    zero = E_mod == 0
+    ux, uy = (np.where(zero, 0, component / np.where(zero, 1, E_mod)).ravel() for component in (Ex, Ey))
+    noise = np.random.default_rng(seed).random(ny * nx)
+
+    total = noise.copy()
+    rows, cols = np.indices((ny, nx), dtype=float)
+    for direction in (1, -1):
+        py, px = rows.ravel(), cols.ravel()
+        index = np.arange(ny * nx)
+        for step in range(length):
+            px = px + direction * ux[index]
+            py = py + direction * uy[index]
+            #nearest point to each new position, wrapping round the edges of the grid
+            index = (np.rint(py).astype(int) % ny) * nx + np.rint(px).astype(int) % nx
+            total += noise[index]
+
+    texture = (total / (2 * length + 1)).reshape(ny, nx)
+    texture[zero] = np.nan
+    dx = (x[-1] - x[0]) / (nx - 1) if nx > 1 else 1
+    dy = (y[-1] - y[0]) / (ny - 1) if ny > 1 else 1
+    return texture, (x[0] - dx/2, x[-1] + dx/2, y[-1] + dy/2, y[0] - dy/2)
@@ -0,0 +1,153 @@
+"""Scene descriptions: the list of shapes making up a canvas design, independent of tkinter.
+Each shape is recorded the same way `GUI.draw_shape` places it - a type ("Rectangle", "Oval" or "Triangle"),
+a centre (x,y), a width and height in pixels, a rotation angle in degrees, its potential in volts,
+whether it sets a boundary (True) or resets points to the background (False), and its drawing colour.
+
+Scenes can be saved to and loaded from JSON, e.g.
+    {"width": 600, "height": 500,
+     "shapes": [{"type": "Rectangle", "centre": [300, 150], "width": 400, "height": 20, "angle": 0,
+                 "potential": 10.0, "boundary": true, "colour": "#ff0000"}, ...]}
+and turned into mask and potential arrays without a display with Scene.rasterize(), or an image with Scene.render().
+"""
+import json
+
+import numpy as np
+from numba import jit, prange
+
+from shapes import half_extents
+
+
+SHAPE_TYPES = ("Rectangle", "Oval", "Triangle")
+
+
+class Scene():
+
+    """Ordered list of shapes on a canvas of a given width and height (in pixels, one grid point per pixel).
+    Later shapes are drawn over earlier ones, exactly as when they are placed one after another in the GUI.
+    """
+
+    def __init__(self, width=500, height=500, shapes=None):
+        self.width, self.height = width, height
+        self.shapes = []
+        for shape in shapes or []:
+            self.add_shape(**shape)
+        return
+
+
+    def add_shape(self, type, centre, width, height, angle=0, potential=0.0, boundary=True, colour="#000000"):
+        #append a shape to the scene - the keyword names match the keys saved in JSON
+        if type not in SHAPE_TYPES:
+            raise ValueError("Unknown shape type '{0}' - expected one of {1}.".format(type, list(SHAPE_TYPES)))
+        self.shapes.append({"type":type, "centre":[float(centre[0]), float(centre[1])],
+                            "width":int(width), "height":int(height), "angle":float(angle),
+                            "potential":float(potential), "boundary":bool(boundary), "colour":colour})
+        return
+
+
+    def clear(self):
+        self.shapes = []
+        return
+
+
+    def to_dict(self):
+        return {"width":self.width, "height":self.height, "shapes":[dict(shape) for shape in self.shapes]}
+
+
+    @classmethod
+    def from_dict(cls, description):
+        return cls(description["width"], description["height"], description.get("shapes", []))
+
+
+    def save(self, filename):
+        with open(filename, "w") as file:
+            json.dump(self.to_dict(), file, indent=1)
+        return
+
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as file:
+            return cls.from_dict(json.load(file))
+
+
+    def rasterize(self, grid_shape=None):
+        #mask and potential arrays of the whole scene, as built up by GUI.add_new_potential
+        #maskarray is Boolean, True for boundary points (the GUI convention - invert it for the solvers)
+        #grid_shape defaults to (height, width) of the scene
+        owner = self._owners(grid_shape)
+        covered = owner >= 0
+        boundary = np.array([shape["boundary"] for shape in self.shapes], dtype=bool)
+        potential = np.array([shape["potential"] for shape in self.shapes], dtype=float)
+
+        maskarray = np.zeros(owner.shape, dtype=bool)
+        potentialarray = np.zeros(owner.shape)
+        maskarray[covered] = boundary[owner[covered]]
+        potentialarray[maskarray] = potential[owner[maskarray]]
+        return maskarray, potentialarray
+
+
+    def render(self, grid_shape=None, background="#ffffff"):
+        #RGB image of the scene as drawn on the canvas - each point in the colour of the last shape covering it
+        #(background shapes included, as they are drawn too) - an array of uint8 of shape (height, width, 3)
+        owner = self._owners(grid_shape)
+        colours = np.array([_rgb(shape["colour"]) for shape in self.shapes] + [_rgb(background)], dtype=np.uint8)
+        return colours[owner]  # - owner -1 (no shape) picks the background, last in the list
+
+
+    def _owners(self, grid_shape=None):
+        #index of the last shape covering each grid point, -1 where there is none
+        #
+        #all shapes are rasterized in one compiled pass over the grid: each row tests the shapes crossing it in order,
+        #so every grid point takes the value of the last shape covering it - exactly as drawing the shapes in turn
+        ny, nx = (self.height, self.width) if grid_shape is None else grid_shape
+        owner = np.full((ny, nx), -1, dtype=np.int64)
+
+        if self.shapes:
+            centres = np.array([shape["centre"] for shape in self.shapes], dtype=float)
+            widths = np.array([shape["width"] for shape in self.shapes])
+            heights = np.array([shape["height"] for shape in self.shapes])
+            angles = np.array([shape["angle"] for shape in self.shapes], dtype=float)
+            kinds = np.array([SHAPE_TYPES.index(shape["type"]) for shape in self.shapes])
+
+            #bounding boxes, as in shapes.bounding_box (clipped to the grid within the kernel)
+            ex, ey = half_extents(widths, heights, angles)
+            boxes = np.c_[np.floor(centres[:,0] - ex), np.ceil(centres[:,0] + ex),
+                          np.floor(centres[:,1] - ey), np.ceil(centres[:,1] + ey)].astype(np.int64)
+
+            theta = np.radians(angles)
+            _paint_shapes(owner, kinds, centres, widths//2, heights//2, np.cos(theta), np.sin(theta), boxes)
+        return owner
+
+
+def _rgb(colour):
+    #(r,g,b) values of a "#rrggbb" colour code, as made by GUI.get_colour
+    return tuple(int(colour[i:i+2], 16) for i in (1, 3, 5))
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _paint_shapes(owner, kinds, centres, a, b, cos, sin, boxes):
+    #record in owner the index of the last shape covering each grid point
+    #kinds index SHAPE_TYPES, a,b are half widths and heights, and boxes hold each shape's x_0,x_1,y_0,y_1
+    #points are rotated back into each shape's frame and tested as in shapes.inside_shape, with the same arithmetic
+    ny, nx = owner.shape
+    eps = 1e-9
+    for row in prange(ny):
+        for i in range(len(kinds)):
+            if row < boxes[i,2] or row > boxes[i,3]:
+                continue
+            dy = row - centres[i,1]
+            for col in range(max(boxes[i,0], 0), min(boxes[i,1], nx-1) + 1):
+                dx = col - centres[i,0]
+                u = dx * cos[i] + dy * sin[i]
+                v = dy * cos[i] - dx * sin[i]
+
+                if kinds[i] == 0:  # - Rectangle
+                    inside = abs(u) <= a[i] + eps and abs(v) <= b[i] + eps
+                elif kinds[i] == 1:  # - Oval
+                    inside = (u * b[i])**2 + (v * a[i])**2 <= (a[i] * b[i])**2 + eps
+                else:  # - Triangle
+                    inside = v <= b[i] + eps and a[i] * (v + b[i]) >= 2 * b[i] * abs(u) - eps
+
+                if inside:
+                    owner[row,col] = i
+    return
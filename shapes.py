@@ -0,0 +1,112 @@
+"""Geometry of the shapes drawn on the GUI canvas, kept separate from tkinter.
+Shapes are described the same way as in the GUI: a type ("Rectangle", "Oval" or "Triangle"), a centre (x,y),
+a width and height in pixels, and a rotation angle in degrees.
+These functions work out which grid points a shape covers, for filling the mask and potential arrays.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+
+def bounding_box(xs, ys, grid_shape, margin=0):
+    #slices (rows, columns) of the grid covering all the given x,y coordinates, expanded by margin
+    #clipped to the grid - returns None if the box lies entirely outside it
+    ny,nx = grid_shape
+    x_0 = max(int(np.floor(np.min(xs) - margin)), 0)
+    y_0 = max(int(np.floor(np.min(ys) - margin)), 0)
+    x_1 = min(int(np.ceil(np.max(xs) + margin)), nx-1)
+    y_1 = min(int(np.ceil(np.max(ys) + margin)), ny-1)
+
+    if x_0 > x_1 or y_0 > y_1:
+        return None
+    return slice(y_0, y_1+1), slice(x_0, x_1+1)
+
+
+def half_extents(width, height, angle):
+    #half width and half height of the axis-aligned box around a rotated shape
+    #half sizes use integer division, matching the corner positions used when drawing on the canvas
+    a, b = width//2, height//2
+    theta = np.radians(angle)
+    return abs(a * np.cos(theta)) + abs(b * np.sin(theta)), abs(a * np.sin(theta)) + abs(b * np.cos(theta))
+
+
+def inside_shape(shape, x, y, centre, width, height, angle):
+    #Boolean array of whether the points (x,y) lie inside or on the outline of the shape
+    #x,y can be any broadcastable arrays - e.g. a column of y values and a row of x values
+    #points are rotated back into the shape's own frame (same complex rotation as the canvas drawing)
+    #then compared against the unrotated shape
+    a, b = width//2, height//2
+    local = ((x - centre[0]) + 1j * (y - centre[1])) * np.exp(-1j * np.radians(angle))
+    u, v = local.real, local.imag
+    eps = 1e-9  # - allow for rounding of points exactly on the outline
+
+    if shape == "Rectangle":
+        return (np.abs(u) <= a + eps) & (np.abs(v) <= b + eps)
+    elif shape == "Oval":
+        return (u * b)**2 + (v * a)**2 <= (a * b)**2 + eps
+    elif shape == "Triangle":
+        #apex at the top centre, base along the bottom edge
+        return (v <= b + eps) & (a * (v + b) >= 2 * b * np.abs(u) - eps)
+    raise ValueError("Unknown shape type '{0}'.".format(shape))
+
+
+def rasterize_shape(shape, centre, width, height, angle, grid_shape):
+    #grid points covered by a shape, computed only within its bounding box
+    #returns the (rows, columns) slices of the box, and a Boolean mask of covered points within it
+    ex, ey = half_extents(width, height, angle)
+    region = bounding_box([centre[0]-ex, centre[0]+ex], [centre[1]-ey, centre[1]+ey], grid_shape)
+    if region is None:
+        return None, None
+
+    rows, cols = region
+    y = np.arange(rows.start, rows.stop)[:,None]
+    x = np.arange(cols.start, cols.stop)[None,:]
+    return region, inside_shape(shape, x, y, centre, width, height, angle)
+
+
+def outline_coords(shape, centre, width, height, angle):
+    #flat polygon coordinates [x0,y0, x1,y1, ...] of a shape, as drawn on the canvas
+    #ovals are approximated by 360 points, and every shape is rotated about its centre
+    x_0, y_0 = centre[0] - width//2, centre[1] - height//2
+    x_1, y_1 = centre[0] + width//2, centre[1] + height//2
+
+    if shape == "Oval":
+        angle_step = (np.arange(360) / 360) * 2*np.pi
+        x, y = (x_1 - x_0)//2 * np.cos(angle_step) + centre[0], (y_1 - y_0)//2 * np.sin(angle_step) + centre[1]
+    elif shape == "Triangle":
+        x, y = np.array([x_0, centre[0], x_1]), np.array([y_1, y_0, y_1])
+    elif shape == "Rectangle":
+        x, y = np.array([x_0, x_0, x_1, x_1]), np.array([y_0, y_1, y_1, y_0])
+    else:
+        raise ValueError("Unknown shape type '{0}'.".format(shape))
+
+    rotated = ((x - centre[0]) + 1j * (y - centre[1])) * np.exp(1j * np.radians(angle))
+    return np.c_[rotated.real + centre[0], rotated.imag + centre[1]].ravel()
+
+
+@lru_cache(maxsize=256)
+def outline_template(shape, width, height, angle):
+    #outline_coords of a shape centred on the origin, kept for each (shape, width, height, angle) seen recently
+    #so an outline following the pointer is only moved (added to its centre), not rebuilt and rotated every time
+    #the array is shared between callers, so it's made read-only
+    coords = outline_coords(shape, (0, 0), width, height, angle)
+    coords.flags.writeable = False
+    return coords
+
+
+def rasterize_polygon(coords, grid_shape, radius=1):
+    #grid points inside any polygon given as flat canvas coordinates [x0,y0, x1,y1, ...]
+    #matplotlib's Path.contains_points is used, but only for the points in the polygon's bounding box
+    #(expanded by the radius used for the contains test)
+    from matplotlib.path import Path  # - imported here as matplotlib is slow to import, and only needed for polygons
+    
+    xs, ys = coords[::2], coords[1::2]
+    region = bounding_box(xs, ys, grid_shape, margin=abs(radius)+1)
+    if region is None:
+        return None, None
+
+    rows, cols = region
+    y, x = np.mgrid[rows, cols]
+    test_points = np.c_[x.ravel(), y.ravel()]  # - specific Nx2 format needed for Path
+    shape_mask = Path(list(zip(xs, ys))).contains_points(test_points, radius=radius).reshape(x.shape)
+    return region, shape_mask
@@ -0,0 +1,149 @@
+"""Superposition of conductor solutions, for sweeping electrode voltages without re-solving.
+Laplace's equation is linear, so for a fixed layout of conductors the potential for any set of conductor voltages is
+the weighted sum of the "basis" solutions in which one conductor is held at 1 V and all the others at 0 V.
+The basis is solved once (see ConductorBasis), after which every new set of voltages is a single weighted sum, e.g.
+    basis = ConductorBasis(maskarray, potentialarray, boundary="periodic")
+    final_potentials = basis.potentials([10, -10, 5])
+    C = basis.capacitance_matrix()
+Masks use the solver convention - True for editable background points, False for the conductors.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numba
+import numpy as np
+import scipy.constants
+import scipy.ndimage
+
+import processing
+
+
+class ConductorBasis():
+
+    """Unit solutions of every conductor in a mask, found once and then combined for any voltages.
+    Each connected region of fixed points is a conductor (points touching diagonally included, and regions joined
+    across the edges of a periodic grid) - a region holding more than one potential is split into one conductor per
+    potential, so the potentials drawn are always reproduced. With "fixed" boundaries the edges of the grid are fixed
+    points too, so form (or join) conductors as well.
+    - labels: array of the conductor number of every point, -1 for free points
+    - voltages: the potential each conductor was drawn with, in the order of the labels
+    - basis: array of shape (conductors, height, width) - basis[i] is the solution with conductor i at 1 V
+    """
+
+    def __init__(self, maskarray, potentialarray, boundary="periodic", engine="sparse_direct", rtol=1e-4, workers=None, threads=1, **options):
+        #label the conductors and solve for the basis straight away
+        #with the "sparse_direct" engine the system is factorized once and every basis solution found together from it,
+        #otherwise each is a separate solve with the chosen engine (options passed on), run across "workers" processes
+        #each using "threads" threads for the parallel solver kernels (1 avoids oversubscribing the cores)
+        self.boundary = boundary
+        self.free = processing._free_points(maskarray, boundary)
+        self.labels, self.voltages = label_conductors(self.free, potentialarray, boundary == "periodic")
+        self.basis = self._solve(engine, rtol, workers, threads, options)
+        return
+
+
+    def __len__(self):
+        return len(self.voltages)
+
+
+    def _solve(self, engine, rtol, workers, threads, options):
+        count = len(self.voltages)
+        basis = np.zeros((count,) + self.free.shape)
+        for i in range(count):
+            basis[i][self.labels == i] = 1.0
+        if count == 0 or not self.free.any():
+            return basis
+
+        if engine == "sparse_direct":
+            #one factorization for every right-hand side, each column the unit potentials of one conductor
+            free, lu, C = processing._factorization(self.free, self.boundary)
+            fixed = ~free.ravel()
+            if lu is not None:
+                units = basis.reshape(count, -1)[:, fixed].T
+                basis.reshape(count, -1)[:, free.ravel()] = lu.solve(np.asarray(C @ units)).T
+            return basis
+
+        #workers are started fresh rather than forked - forking after numba's parallel kernels have started OpenMP
+        #threads in this process (as the GUI's warm-up always does) is unsafe
+        with ProcessPoolExecutor(workers, multiprocessing.get_context("spawn"), initializer=numba.set_num_threads,
+                                 initargs=(min(threads, numba.config.NUMBA_NUM_THREADS),)) as pool:
+            solutions = [pool.submit(processing.solve, self.free, basis[i], engine, rtol, self.boundary, **options)
+                         for i in range(count)]
+            for i, solution in enumerate(solutions):
+                basis[i] = solution.result()
+        return basis
+
+
+    def potentials(self, voltages=None):
+        #potential over the grid with each conductor at the given voltage (by default the voltages drawn)
+        #a 2D array of voltages, one set per row, gives a stack of solutions - one for each set
+        voltages = self.voltages if voltages is None else np.asarray(voltages, dtype=float)
+        return np.tensordot(voltages, self.basis, axes=1)
+
+
+    def capacitance_matrix(self):
+        #Maxwell capacitance matrix of the conductors, in farads per metre length (the grid spacing cancels in 2D)
+        #C[j,i] is the charge on conductor j with conductor i at 1 V and the others at 0 V - so charges = C @ voltages
+        #the charge on each fixed point is -ε0 times the net flux of the field into it from its grid neighbours
+        count = len(self.voltages)
+        C = np.zeros((count, count))
+        for i in range(count):
+            charge = -scipy.constants.epsilon_0 * _net_flux(self.basis[i], self.boundary == "periodic")
+            C[:, i] = np.bincount(self.labels[self.labels >= 0], weights=charge[self.labels >= 0], minlength=count)
+        return C
+
+
+    def charges(self, voltages=None):
+        #charge per metre length on each conductor at the given voltages (by default the voltages drawn)
+        voltages = self.voltages if voltages is None else np.asarray(voltages, dtype=float)
+        return self.capacitance_matrix() @ voltages
+
+
+def label_conductors(free, potentialarray, periodic=False):
+    #number the conductors among the fixed (not free) points - connected regions of the same potential
+    #returns the array of labels (-1 for free points) and the potential of each conductor
+    regions, count = scipy.ndimage.label(~free, structure=np.ones((3,3)))
+    if periodic and count:
+        regions = _join_wrapped(regions, count)
+
+    fixed = ~free
+    potentials = np.asarray(potentialarray, dtype=float)[fixed]
+    keys, conductor = np.unique(np.stack([regions[fixed], potentials]), axis=1, return_inverse=True)
+
+    labels = np.full(free.shape, -1)
+    labels[fixed] = conductor.ravel()
+    return labels, keys[1]
+
+
+def _join_wrapped(regions, count):
+    #merge regions which meet across the edges of a periodic grid (including diagonally), keeping the lowest number
+    parent = np.arange(count + 1)
+
+    def root(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    for a, b in ((regions[0], regions[-1]), (regions[:,0], regions[:,-1])):
+        for shift in (-1, 0, 1):
+            pairs = np.stack([a, np.roll(b, shift)])
+            for i, j in np.unique(pairs[:, (pairs[0] > 0) & (pairs[1] > 0)], axis=1).T:
+                i, j = root(i), root(j)
+                parent[max(i, j)] = min(i, j)
+
+    return np.array([root(i) for i in range(count + 1)])[regions]
+
+
+def _net_flux(potentials, periodic):
+    #sum over the grid neighbours of each point of (neighbour - point) - the 5-point Laplacian, counting only
+    #neighbours within the grid unless it wraps round
+    flux = np.zeros_like(potentials)
+    for axis in (0, 1):
+        difference = np.diff(potentials, axis=axis)
+        flux[(slice(None),)*axis + (slice(None, -1),)] += difference
+        flux[(slice(None),)*axis + (slice(1, None),)] -= difference
+        if periodic:
+            wrapped = np.take(potentials, 0, axis) - np.take(potentials, -1, axis)
+            flux[(slice(None),)*axis + (-1,)] += wrapped
+            flux[(slice(None),)*axis + (0,)] -= wrapped
+    return flux
@@ -0,0 +1,155 @@
+"""Domain-decomposed SOR for grids too large to solve in one piece, or in memory at all.
+The grid is split into rectangular tiles, each extended by an overlap on every side (wrapping round the edges
+with periodic boundaries). The potentials live in memory-mapped .npy files, and a pool of worker processes relaxes
+the tiles: each worker copies one tile and its overlap out of the files, applies SOR sweeps with the edge of the
+overlap held fixed (the "halo"), and writes back only the tile itself.
+A round of sweeps reads from one file and writes to another, which then swap, so the halos exchanged between
+neighbouring tiles are those of the previous round and the result is the same however the tiles are scheduled
+(overlapping Schwarz iteration). Rounds continue until no point changes by more than rtol (relative) over a round.
+
+Each worker only holds its own tile, so memory per process is bounded by the tile size rather than the grid size,
+and the tiles of a round are relaxed in parallel across the pool. e.g.
+    final_potentials = tiled_sor(maskarray, potentialarray, boundary="periodic", tile=(1024, 1024), workers=8,
+                                 directory="scratch/")
+returns the solution memory-mapped from scratch/final_potentials.npy (see export.load_arrays to reopen it).
+maskarray and potentialarray can themselves be memory-mapped arrays, e.g. from export.load_arrays.
+"""
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numba
+import numpy as np
+from numpy.lib.format import open_memmap
+
+import processing
+
+
+def tiled_sor(maskarray, potentialarray, rtol=1e-4, boundary="fixed", tile=(512, 512), overlap=8, sweeps=None, workers=None,
+              directory=None, initial=None, dtype=np.float64, maxiter=None, callback=None, chunk=1024, threads=1):
+    #solve by SOR over overlapping tiles relaxed in parallel (see the module description)
+    #tile is the (rows, columns) size of each tile, and overlap the number of points each is extended by on every side
+    #each round applies "sweeps" SOR sweeps to every tile (by default twice the overlap) with the factor that is
+    #optimal for the extended tile's size, then the halos are exchanged
+    #workers is the number of processes (default one per core) - with workers=1 the tiles are relaxed in this process
+    #each worker process uses "threads" threads for the parallel SOR kernel (1 avoids oversubscribing the cores, as the
+    #pool already runs one process per core)
+    #directory holds the memory-mapped files (default a new temporary directory): final_potentials.npy is kept,
+    #the working files are removed once the solve ends
+    #the arrays are copied in and out of the files "chunk" rows at a time, so the full grid is never held in memory
+    #an "initial" guess for the editable points can be given, as for sor()
+    #stops once converged, or after maxiter rounds if given - callback(round, maxchange) is called after every round
+    #with the largest change to any point over the round, and returning True stops the solve early
+    #returns the solution, memory-mapped from directory/final_potentials.npy
+    ny, nx = np.shape(maskarray)
+    periodic = boundary == "periodic"
+    sweeps = 2 * overlap if sweeps is None else sweeps
+    directory = tempfile.mkdtemp(prefix="tiled_sor_") if directory is None else directory
+    os.makedirs(directory, exist_ok=True)
+
+    paths = {name: os.path.join(directory, name + ".npy") for name in ("free", "final_potentials", "buffer")}
+    free = open_memmap(paths["free"], mode="w+", dtype=bool, shape=(ny, nx))
+    source = open_memmap(paths["final_potentials"], mode="w+", dtype=dtype, shape=(ny, nx))
+    target = open_memmap(paths["buffer"], mode="w+", dtype=dtype, shape=(ny, nx))
+
+    for r0 in range(0, ny, chunk):
+        rows = slice(r0, min(r0 + chunk, ny))
+        block = np.asarray(maskarray[rows], dtype=bool)
+        if not periodic:
+            #with "fixed" boundaries the edges of the grid are never updated (as in sor)
+            block = block.copy()
+            block[:, [0, -1]] = False
+            if r0 == 0:
+                block[0] = False
+            if rows.stop == ny:
+                block[-1] = False
+        free[rows] = block
+        source[rows] = potentialarray[rows]
+        if initial is not None:
+            np.copyto(source[rows], initial[rows], where=block)
+    free.flush()
+    source.flush()
+    del free
+
+    tiles = [(r0, min(r0 + tile[0], ny), c0, min(c0 + tile[1], nx)) for r0 in range(0, ny, tile[0]) for c0 in range(0, nx, tile[1])]
+    #workers are started fresh rather than forked, as forking after the numba kernels have started OpenMP threads
+    #in this process is unsafe
+    pool = None
+    if workers != 1:
+        pool = ProcessPoolExecutor(workers, multiprocessing.get_context("spawn"), initializer=numba.set_num_threads,
+                                   initargs=(min(threads, numba.config.NUMBA_NUM_THREADS),))
+    names = ["final_potentials", "buffer"]
+
+    try:
+        iteration = 0
+        while maxiter is None or iteration < maxiter:
+            arguments = (paths["free"], paths[names[0]], paths[names[1]], periodic, overlap, sweeps, rtol)
+            if pool is None:
+                results = [_relax_tile(bounds, *arguments) for bounds in tiles]
+            else:
+                results = list(pool.map(_relax_tile, tiles, *[[argument] * len(tiles) for argument in arguments]))
+            names.reverse()
+            iteration += 1
+
+            maxchange = max(change for change, converged in results)
+            if callback is not None and callback(iteration, maxchange):
+                break
+            if all(converged for change, converged in results):
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    #the latest round was written to names[0] - keep it as final_potentials.npy
+    del source, target
+    if names[0] != "final_potentials":
+        os.replace(paths[names[0]], paths["final_potentials"])
+    for name in ("free", "buffer"):
+        if os.path.exists(paths[name]):
+            os.remove(paths[name])
+    return np.load(paths["final_potentials"], mmap_mode="r+")
+
+
+def _relax_tile(bounds, free_path, source_path, target_path, periodic, overlap, sweeps, rtol):
+    #runs in a worker process: relax one tile, reading it and its overlap from the source file and writing the tile
+    #alone to the target file - returns the largest change over the round and whether every change was within rtol
+    r0, r1, c0, c1 = bounds
+    free = np.load(free_path, mmap_mode="r")
+    source = np.load(source_path, mmap_mode="r")
+    ny, nx = free.shape
+
+    #rows and columns of the extended tile - wrapping round for periodic, otherwise cut off at the edges of the grid
+    #(those edges are then fixed points, which serve as the halo)
+    rows = np.arange(r0 - overlap, r1 + overlap)
+    cols = np.arange(c0 - overlap, c1 + overlap)
+    if periodic:
+        rows, cols = rows % ny, cols % nx
+    else:
+        rows = rows[(rows >= 0) & (rows < ny)]
+        cols = cols[(cols >= 0) & (cols < nx)]
+    block = np.ix_(rows, cols)
+
+    v = np.array(source[block])
+    mask = np.array(free[block])
+    #the outermost ring is the halo, held at the neighbouring tiles' potentials from the last round
+    mask[[0, -1], :] = False
+    mask[:, [0, -1]] = False
+    top, left = (overlap, overlap) if periodic else (min(overlap, r0), min(overlap, c0))
+    owned = (slice(top, top + r1 - r0), slice(left, left + c1 - c0))
+    old = v[owned].copy()
+
+    if mask.any():
+        f = processing.optimal_relaxation(mask, "fixed", method="grid")
+        omega = np.full((sweeps, 2), f, dtype=v.dtype)
+        rowchange = np.zeros(v.shape[0])
+        rowconverged = np.zeros(v.shape[0], dtype=np.bool_)
+        processing._redblack_sweeps(v, mask, omega, rtol, 0.0, False, False, rowchange, rowconverged)
+
+    target = np.load(target_path, mmap_mode="r+")
+    target[r0:r1, c0:c1] = v[owned]
+    target.flush()
+
+    change = np.abs(v[owned] - old)
+    floor = 2 * np.finfo(v.dtype).eps * np.abs(old).max(initial=0)
+    return float(change.max(initial=0)), bool((change <= rtol * np.abs(old) + floor).all())